@@ -0,0 +1,167 @@
+import os
+import math
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from metrics import ADMISSION_ACTIVE, ADMISSION_LIMIT, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT
+
+
+class AdmissionRejected(Exception):
+    """Raised when work cannot be admitted; retry_after is a hint in seconds."""
+
+    def __init__(self, pool: str, reason: str, retry_after: int):
+        super().__init__(f"{pool} is overloaded ({reason}); retry after {retry_after}s")
+        self.pool = pool
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A held slot. release() is idempotent so several cleanup paths may call it."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired_at = time.monotonic()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(time.monotonic() - self._acquired_at)
+
+
+class AdmissionController:
+    """
+    Bounded concurrency pool with a bounded FIFO wait queue.
+
+    Up to `max_concurrent` holders run at once; up to `max_queue` more wait
+    (None = unbounded) for at most `queue_timeout` seconds (None = forever).
+    Work arriving at a full queue, or waiting past its deadline, is rejected
+    with AdmissionRejected carrying a Retry-After estimate derived from the
+    recent average hold time.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._avg_hold = 1.0
+        self.stats = {"admitted": 0, "waited": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+        ADMISSION_LIMIT.labels(pool=name, limit="concurrency").set(max_concurrent)
+        ADMISSION_LIMIT.labels(pool=name, limit="queue").set(max_queue if max_queue is not None else -1)
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, max_concurrent: int, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None) -> "AdmissionController":
+        """
+        Read {prefix}_MAX_CONCURRENCY, {prefix}_MAX_QUEUE and {prefix}_QUEUE_TIMEOUT,
+        falling back to the given defaults. An empty value means unbounded.
+        """
+        def setting(suffix: str, default, cast):
+            raw = os.getenv(f"{prefix}_{suffix}")
+            if raw is None:
+                return default
+            return cast(raw) if raw.strip() else None
+
+        return cls(
+            name,
+            max_concurrent=setting("MAX_CONCURRENCY", max_concurrent, int) or max_concurrent,
+            max_queue=setting("MAX_QUEUE", max_queue, int),
+            queue_timeout=setting("QUEUE_TIMEOUT", queue_timeout, float),
+        )
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new arrival."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._avg_hold * backlog / self.max_concurrent))
+
+    def _reject(self, reason: str):
+        self.stats[f"rejected_{reason}"] += 1
+        ADMISSION_REJECTED.labels(pool=self.name, reason=reason).inc()
+        raise AdmissionRejected(self.name, reason, self.retry_after())
+
+    def _update_gauges(self):
+        ADMISSION_ACTIVE.labels(pool=self.name).set(self._active)
+        ADMISSION_QUEUED.labels(pool=self.name).set(len(self._waiters))
+
+    async def acquire(self) -> AdmissionTicket:
+        """Wait for a slot; raises AdmissionRejected when the queue is full or the wait times out."""
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self.stats["admitted"] += 1
+            self._update_gauges()
+            return AdmissionTicket(self)
+
+        if self.max_queue is not None and len(self._waiters) >= self.max_queue:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["waited"] += 1
+        self._update_gauges()
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self._reject("timeout")
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        finally:
+            ADMISSION_WAIT.labels(pool=self.name).observe(time.monotonic() - started)
+
+        # The releasing holder handed its slot straight to us (_active unchanged)
+        self.stats["admitted"] += 1
+        self._update_gauges()
+        return AdmissionTicket(self)
+
+    def _abandon(self, waiter: asyncio.Future):
+        """Clean up a waiter that gave up, passing on a slot it may have been handed meanwhile."""
+        if waiter.done() and not waiter.cancelled():
+            self._release(None)
+        else:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            self._update_gauges()
+
+    def _release(self, held: Optional[float]):
+        if held is not None:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self._active -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self):
+        """async with controller.slot(): ... holds a slot for the block."""
+        ticket = await self.acquire()
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self._active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+        }
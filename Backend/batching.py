@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class MicroBatcher:
+    """
+    Packs concurrent submissions into batches for one upstream call.
+
+    A batch is sent as soon as `max_batch` items are waiting, or `max_delay`
+    seconds after its first item arrived. `fn` receives the list of items and
+    must return one result per item, in order; if it raises (or returns the
+    wrong number of results) every submitter of that batch gets the error.
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch: int = 5, max_delay: float = 0.05):
+        self.name = name
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+        self.stats = {"batches": 0, "items": 0}
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        # Submitters that gave up while the batch was filling are dropped
+        live = [(item, future) for item, future in batch if not future.done()]
+        if not live:
+            return
+        self.stats["batches"] += 1
+        self.stats["items"] += len(live)
+        try:
+            results = await self.fn([item for item, _ in live])
+            if len(results) != len(live):
+                raise ValueError(f"{self.name}: expected {len(live)} results, got {len(results)}")
+        except Exception as e:
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(live, results):
+            if not future.done():
+                future.set_result(result)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "waiting": len(self._pending), "running": len(self._running)}
@@ -0,0 +1,262 @@
+"""
+Offline benchmark for the /vibecheck/ endpoint.
+
+Runs the FastAPI app in-process against a fake Gemini backend and stub
+Graph API / image CDN transports with configurable latency and error rates,
+then drives /vibecheck/ at fixed concurrency levels and reports throughput,
+latency percentiles and event-loop lag. Results are written as JSON so runs
+can be compared.
+
+    python benchmark.py --concurrency 1,8,32 --requests 200 --llm-latency 0.8
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import platform
+import contextlib
+from io import BytesIO
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import httpx
+from PIL import Image
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class FakeGraphAPI:
+    """Stub for graph.facebook.com serving /me, /{id}/media and ?ids= lookups with injected latency and errors."""
+
+    def __init__(self, latency: float, error_rate: float, unique_content: bool = True, total_posts: int = 500):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.unique_content = unique_content
+        self.total_posts = total_posts
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            return httpx.Response(500, json={"error": {"message": "injected error", "code": 2}})
+
+        if request.url.path.endswith("/me"):
+            return httpx.Response(200, json={"id": "1000", "name": "Benchmark Page"})
+
+        if request.url.path.endswith("/media"):
+            # Cursor paging like the real API: ?after=<offset>, paging.next while posts remain
+            limit = int(request.url.params.get("limit", "12"))
+            offset = int(request.url.params.get("after", "0"))
+            tag = request.url.params.get("tag") or (uuid.uuid4().hex[:8] if self.unique_content else "static")
+            end = min(offset + limit, self.total_posts)
+            body = {"data": [
+                {
+                    "id": f"{tag}_{i}",
+                    "caption": f"Post {i} {tag} coffee and study vibes ☕ #aesthetic #study",
+                    "media_type": "IMAGE",
+                    "media_url": f"https://cdn.benchmark.local/img/{i % 4}.jpg",
+                    "permalink": f"https://www.instagram.com/p/{tag}{i}/",
+                    "timestamp": f"2025-01-{(i % 28) + 1:02d}T12:00:00+0000",
+                    "like_count": 10 * i,
+                    "comments_count": i,
+                }
+                for i in range(offset, end)
+            ]}
+            if end < self.total_posts:
+                body["paging"] = {"next": str(request.url.copy_merge_params({"after": end, "tag": tag}))}
+            return httpx.Response(200, json=body)
+
+        if request.url.params.get("ids"):
+            # Multi-ID lookup re-reading media URLs of posts kept in the profile store
+            return httpx.Response(200, json={
+                media_id: {"id": media_id, "media_url": f"https://cdn.benchmark.local/img/{int(media_id.rsplit('_', 1)[-1]) % 4}.jpg"}
+                for media_id in request.url.params["ids"].split(",")
+            })
+
+        return httpx.Response(404, json={"error": {"message": "unknown endpoint"}})
+
+
+class FakeImageCDN:
+    """Stub CDN returning a handful of generated JPEGs."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.requests = 0
+        self.images = []
+        for color in [(230, 120, 90), (40, 60, 120), (200, 200, 180), (20, 140, 80)]:
+            buffer = BytesIO()
+            Image.new("RGB", (1080, 1080), color).save(buffer, "JPEG")
+            self.images.append(buffer.getvalue())
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        index = int(request.url.path.rsplit("/", 1)[-1].split(".")[0]) % len(self.images)
+        return httpx.Response(200, content=self.images[index], headers={"Content-Type": "image/jpeg"})
+
+
+async def monitor_loop_lag(samples: List[float], interval: float = 0.01):
+    """Record how late the event loop wakes up a sleeping task."""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - start - interval))
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, total: int,
+                    max_posts: int, usernames: List[str]) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    lag_samples: List[float] = []
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            body = {"insta_link": usernames[index % len(usernames)], "max_posts": max_posts}
+            start = time.perf_counter()
+            try:
+                response = await client.post("/vibecheck/", json=body)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    lag_task = asyncio.create_task(monitor_loop_lag(lag_samples))
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    lag_task.cancel()
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "duration_seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "latency_seconds": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies), 4) if latencies else 0.0,
+        },
+        "event_loop_lag_seconds": {
+            "p50": round(percentile(lag_samples, 50), 4),
+            "p99": round(percentile(lag_samples, 99), 4),
+            "max": round(max(lag_samples), 4) if lag_samples else 0.0,
+        },
+        "status_counts": statuses,
+    }
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    # Configure the app before importing it: fake LLM, fake Instagram credentials
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY"] = str(args.llm_latency)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.llm_error_rate)
+    os.environ.setdefault("INSTAGRAM_APP_ID", "benchmark-app")
+    os.environ.setdefault("INSTAGRAM_APP_SECRET", "benchmark-secret")
+    os.environ.setdefault("INSTAGRAM_PAGE_ACCESS_TOKEN", "benchmark-token")
+    os.environ.setdefault("INSTAGRAM_BUSINESS_ACCOUNT_ID", "1000")
+    # Client-side quota pacing is off unless explicitly configured, so limits don't mask app throughput
+    os.environ.setdefault("GEMINI_RATE_LIMIT", "0")
+    os.environ.setdefault("GRAPH_API_RATE_LIMIT", "0")
+    if not args.verbose:
+        os.environ["LOG_SPANS"] = "false"
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main
+    from http_client import GraphHTTPClient
+    from instagram_api import InstagramBusinessAPI
+
+    graph = FakeGraphAPI(args.graph_latency, args.graph_error_rate, unique_content=not args.warm_cache)
+    cdn = FakeImageCDN(args.image_latency)
+    main.image_fetcher.transport = httpx.MockTransport(cdn)
+
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        # Swap the startup-built Instagram client for one pointed at the stub (same limits)
+        startup_api = main.app.state.business_api
+        await startup_api.aclose()
+        business_api = InstagramBusinessAPI(http_client=GraphHTTPClient(
+            transport=httpx.MockTransport(graph), backoff=0.05,
+            admission=startup_api.http.admission, rate_limiter=startup_api.http.rate_limiter,
+            circuit=startup_api.http.circuit))
+        await business_api.start()
+        main.app.state.business_api = business_api
+
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark",
+                                     timeout=args.timeout) as client:
+            for concurrency in args.concurrency:
+                if args.warm_cache:
+                    usernames = [f"bench_user_{i}" for i in range(10)]
+                else:
+                    usernames = [f"bench_{concurrency}_{i}_{uuid.uuid4().hex[:6]}" for i in range(args.requests)]
+                # The app logs every request to stdout; keep the report readable
+                with open(os.devnull, "w") as devnull, \
+                        contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                    level = await run_level(client, concurrency, args.requests, args.max_posts, usernames)
+                results.append(level)
+                print(f"concurrency={concurrency:<4} rps={level['throughput_rps']:<8} "
+                      f"p50={level['latency_seconds']['p50']:<7} p95={level['latency_seconds']['p95']:<7} "
+                      f"p99={level['latency_seconds']['p99']:<7} loop_lag_p99={level['event_loop_lag_seconds']['p99']:<7} "
+                      f"statuses={level['status_counts']}")
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "config": {
+            "requests_per_level": args.requests,
+            "max_posts": args.max_posts,
+            "llm_latency": args.llm_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "graph_latency": args.graph_latency,
+            "graph_error_rate": args.graph_error_rate,
+            "image_latency": args.image_latency,
+            "warm_cache": args.warm_cache,
+            "pipeline_mode": os.getenv("VIBECHECK_PIPELINE_MODE", "standard"),
+        },
+        "upstream_requests": {"graph_api": graph.requests, "image_cdn": cdn.requests},
+        "levels": results,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline /vibecheck/ benchmark with fake upstreams")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[1, 8, 32],
+                        help="comma-separated concurrency levels (default: 1,8,32)")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--max-posts", type=int, default=12)
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="fake Gemini latency in seconds")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--graph-latency", type=float, default=0.15, help="fake Graph API latency in seconds")
+    parser.add_argument("--graph-error-rate", type=float, default=0.0)
+    parser.add_argument("--image-latency", type=float, default=0.05, help="fake CDN latency in seconds")
+    parser.add_argument("--warm-cache", action="store_true",
+                        help="reuse a small pool of usernames and static content so caches can hit")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the JSON results")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own logging and span output")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    report = asyncio.run(run_benchmark(arguments))
+    with open(arguments.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {arguments.output}")
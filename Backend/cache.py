@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from metrics import CACHE_LOOKUP_DURATION, CACHE_REQUESTS, span
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process LRU in front of an optional SQLite store.
+
+    Entries are fresh for `ttl` seconds and may still be served as stale until
+    `stale_ttl` so callers can refresh in the background (stale-while-revalidate).
+    Values must be JSON-serializable when the disk tier is enabled.
+
+    Async callers use aget/aset/ainvalidate: memory hits are served inline and
+    SQLite work runs in a worker thread, so disk I/O never blocks the event loop.
+    The two tiers have separate locks, so memory lookups don't wait on the disk.
+    """
+
+    def __init__(self, namespace: str, max_entries: int = 256, ttl: Optional[float] = 300.0,
+                 stale_ttl: Optional[float] = 3600.0, db_path: Optional[str] = None,
+                 max_disk_entries: int = 5000):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl if stale_ttl is not None else ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0}
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db.commit()
+
+    def _age_state(self, stored_at: float) -> Optional[bool]:
+        """True if fresh, False if stale but servable, None if expired."""
+        if self.ttl is None:
+            return True
+        age = time.time() - stored_at
+        if age < self.ttl:
+            return True
+        if age < self.stale_ttl:
+            return False
+        return None
+
+    def get(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """Return (value, is_fresh) or None on a miss."""
+        with span("cache_lookup", CACHE_LOOKUP_DURATION, cache=self.namespace):
+            hit = self._get_memory(key)
+            if hit is None and self._db is not None:
+                hit = self._get_disk(key)
+            if hit is None:
+                self._miss()
+            return hit
+
+    async def aget(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """get() for event-loop callers."""
+        with span("cache_lookup", CACHE_LOOKUP_DURATION, cache=self.namespace):
+            hit = self._get_memory(key)
+            if hit is None and self._db is not None:
+                hit = await asyncio.to_thread(self._get_disk, key)
+            if hit is None:
+                self._miss()
+            return hit
+
+    def _count(self, result: str):
+        self.stats[result] += 1
+        CACHE_REQUESTS.labels(cache=self.namespace, result=result).inc()
+
+    def _miss(self):
+        with self._lock:
+            self._count("misses")
+
+    def _get_memory(self, key: str) -> Optional[Tuple[Any, bool]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            state = self._age_state(entry[1])
+            if state is None:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self._count("memory_hits" if state else "stale_hits")
+            return entry[0], state
+
+    def _get_disk(self, key: str) -> Optional[Tuple[Any, bool]]:
+        with self._db_lock:
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT value, stored_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            state = self._age_state(row[1])
+            if state is None:
+                return None
+            value = json.loads(row[0])
+            self._db.execute(
+                "UPDATE cache_entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (time.time(), self.namespace, key),
+            )
+            self._db.commit()
+        with self._lock:
+            self._put_memory(key, value, row[1])
+            self._count("disk_hits" if state else "stale_hits")
+        return value, state
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+        if self._db is not None:
+            self._set_disk(key, value, now)
+
+    async def aset(self, key: str, value: Any):
+        """set() for event-loop callers."""
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value, now)
+
+    def _set_disk(self, key: str, value: Any, stored_at: float):
+        data = json.dumps(value)
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, stored_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, data, stored_at, stored_at),
+            )
+            self._evict_disk()
+            self._db.commit()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._memory.pop(key, None)
+        if self._db is not None:
+            self._invalidate_disk(key)
+
+    async def ainvalidate(self, key: str):
+        """invalidate() for event-loop callers."""
+        with self._lock:
+            self._memory.pop(key, None)
+        if self._db is not None:
+            await asyncio.to_thread(self._invalidate_disk, key)
+
+    def _invalidate_disk(self, key: str):
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (self.namespace, key)
+            )
+            self._db.commit()
+
+    def _put_memory(self, key: str, value: Any, stored_at: float):
+        self._memory[key] = (value, stored_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self):
+        count = self._db.execute(
+            "SELECT COUNT(*) FROM cache_entries WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM cache_entries WHERE rowid IN ("
+                " SELECT rowid FROM cache_entries WHERE namespace = ?"
+                " ORDER BY accessed_at LIMIT ?)",
+                (self.namespace, overflow),
+            )
+            with self._lock:
+                self.stats["evictions"] += overflow
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters and sizes for diagnostics."""
+        return {
+            **self.stats,
+            "memory_entries": len(self._memory),
+            "disk_enabled": self._db is not None,
+        }
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def create_vibe_cache() -> TieredCache:
+    """Build the /vibecheck/ response cache from environment configuration."""
+    return TieredCache(
+        namespace="vibecheck",
+        max_entries=int(os.getenv("VIBE_CACHE_MAX_ENTRIES", "256")),
+        ttl=float(os.getenv("VIBE_CACHE_TTL", "300")),
+        stale_ttl=float(os.getenv("VIBE_CACHE_STALE_TTL", "3600")),
+        db_path=os.getenv("VIBE_CACHE_DB") or None,
+        max_disk_entries=int(os.getenv("VIBE_CACHE_MAX_DISK_ENTRIES", "5000")),
+    )
+
+
+def create_demo_cache() -> TieredCache:
+    """
+    Build the short-lived, memory-only cache for responses built from demo data
+    (no Instagram credentials), which the main response cache never stores.
+    """
+    ttl = float(os.getenv("VIBE_CACHE_DEMO_TTL", "60"))
+    return TieredCache(
+        namespace="vibecheck_demo",
+        max_entries=int(os.getenv("VIBE_CACHE_MAX_ENTRIES", "256")),
+        ttl=ttl,
+        stale_ttl=ttl,
+    )
@@ -0,0 +1,139 @@
+import os
+import re
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Set
+
+from metrics import CAPTION_PROMPT_TOKENS
+
+HASHTAG_RE = re.compile(r"#(\w+)")
+MENTION_RE = re.compile(r"@\w+")
+URL_RE = re.compile(r"https?://\S+")
+EMOJI_RE = re.compile("[\U0001F1E6-\U0001F1FF\U0001F300-\U0001FAFF\u2600-\u27BF\u2B50\u2B55]\uFE0F?")
+# Numbers are ignored when comparing captions ("Day 3 in Bali" ~ "Day 4 in Bali")
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+# Rough Gemini tokenizer ratio for mixed English social media text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def spread_order(n: int) -> List[int]:
+    """
+    Indices 0..n-1 ordered so that every prefix is spread across the range
+    (0, 8, 4, 2, 6, 1, 3, ... for n=10): sampling a prefix keeps old and new posts.
+    """
+    order, seen = [], set()
+    step = 1 << max(0, n - 1).bit_length()
+    while step:
+        for i in range(0, n, step):
+            if i not in seen:
+                seen.add(i)
+                order.append(i)
+        step >>= 1
+    return order
+
+
+@dataclass
+class PreparedCaptions:
+    text: str
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+class CaptionPreprocessor:
+    """
+    Shrinks a profile's captions to a bounded prompt before caption analysis.
+
+    Hashtags and emojis are pulled out of every caption and summarised as counts,
+    long captions are cut to `max_caption_tokens`, and captions are picked in an
+    order spread evenly over the timeline until `token_budget` is used up,
+    skipping near-duplicates of ones already picked (word-set Jaccard >=
+    `similarity`). Picked captions keep their original order.
+    """
+
+    def __init__(self, token_budget: int = 1500, max_caption_tokens: int = 80,
+                 similarity: float = 0.8, max_features: int = 10):
+        self.token_budget = token_budget
+        self.max_caption_tokens = max_caption_tokens
+        self.similarity = similarity
+        self.max_features = max_features
+
+    @classmethod
+    def from_env(cls) -> "CaptionPreprocessor":
+        return cls(
+            token_budget=int(os.getenv("CAPTION_TOKEN_BUDGET", "1500")),
+            max_caption_tokens=int(os.getenv("CAPTION_MAX_TOKENS_PER_POST", "80")),
+            similarity=float(os.getenv("CAPTION_DEDUPE_SIMILARITY", "0.8")),
+        )
+
+    def _trim(self, text: str) -> str:
+        limit = self.max_caption_tokens * CHARS_PER_TOKEN
+        if len(text) <= limit:
+            return text
+        cut = text[:limit].rsplit(" ", 1)[0] or text[:limit]
+        return cut + "…"
+
+    def _is_duplicate(self, words: Set[str], kept_words: List[Set[str]]) -> bool:
+        return any(len(words & other) / len(words | other) >= self.similarity for other in kept_words)
+
+    def features(self, captions: List[str]) -> str:
+        """Hashtag and emoji counts over every caption, e.g. "Hashtags: #study x3, #coffee. Emojis: ☕ x2"."""
+        hashtags = Counter(tag.lower() for caption in captions for tag in HASHTAG_RE.findall(caption))
+        emojis = Counter(e.rstrip("\uFE0F") for caption in captions for e in EMOJI_RE.findall(caption))
+
+        def summarise(counts: Counter, prefix: str) -> str:
+            return ", ".join(f"{prefix}{item} x{count}" if count > 1 else f"{prefix}{item}"
+                             for item, count in counts.most_common(self.max_features))
+
+        parts = []
+        if hashtags:
+            parts.append(f"Hashtags: {summarise(hashtags, '#')}")
+        if emojis:
+            parts.append(f"Emojis: {summarise(emojis, '')}")
+        return ". ".join(parts)
+
+    def prepare(self, captions: List[str]) -> PreparedCaptions:
+        captions = [c for c in captions if c and c.strip()]
+        features = self.features(captions)
+
+        bodies = []
+        for caption in captions:
+            body = EMOJI_RE.sub(" ", HASHTAG_RE.sub(" ", URL_RE.sub(" ", MENTION_RE.sub(" ", caption))))
+            bodies.append(self._trim(" ".join(body.split())))
+
+        # Walk the timeline in spread order, skipping captions too similar to one already
+        # kept, until the budget is full; comparisons are bounded by what fits the budget
+        budget = self.token_budget - estimate_tokens(features)
+        chosen: List[int] = []
+        kept_words: List[Set[str]] = []
+        duplicates, used = 0, 0
+        for i in spread_order(len(bodies)):
+            if budget - used < 2:
+                break
+            words = set(WORD_RE.findall(bodies[i].lower()))
+            if not words:
+                continue
+            if self._is_duplicate(words, kept_words):
+                duplicates += 1
+                continue
+            cost = estimate_tokens(bodies[i]) + 1
+            if used + cost <= budget:
+                chosen.append(i)
+                kept_words.append(words)
+                used += cost
+        body_text = " | ".join(bodies[i] for i in sorted(chosen))
+
+        text = f"{body_text}\n{features}" if body_text and features else body_text or features
+        tokens = estimate_tokens(text)
+        CAPTION_PROMPT_TOKENS.observe(tokens)
+        return PreparedCaptions(text, {
+            "captions": len(captions),
+            "duplicates": duplicates,
+            "kept": len(chosen),
+            "tokens": tokens,
+            "budget": self.token_budget,
+        })
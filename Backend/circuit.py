@@ -0,0 +1,118 @@
+import os
+import time
+from typing import Any, Dict, Optional
+
+from metrics import CIRCUIT_REJECTED, CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} circuit open; next probe in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one upstream.
+
+    closed:    calls go through; `failure_threshold` consecutive failures open it.
+    open:      calls fail fast with CircuitOpen for `reset_timeout` seconds.
+    half_open: up to `half_open_max_calls` probes go through; a success closes
+               the circuit, a failure re-opens it for another `reset_timeout`.
+
+    Callers bracket each upstream call with allow() and record(success), where
+    success=None marks an outcome that says nothing about upstream health
+    (cancelled, throttled locally, ...).
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.stats = {"successes": 0, "failures": 0, "short_circuited": 0, "opened": 0}
+        CIRCUIT_STATE.labels(upstream=name).set(0)
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str) -> "CircuitBreaker":
+        """Read {prefix}_CIRCUIT_FAILURE_THRESHOLD, _RESET_TIMEOUT and _HALF_OPEN_CALLS."""
+        return cls(
+            name,
+            failure_threshold=int(os.getenv(f"{prefix}_CIRCUIT_FAILURE_THRESHOLD", "5")),
+            reset_timeout=float(os.getenv(f"{prefix}_CIRCUIT_RESET_TIMEOUT", "30")),
+            half_open_max_calls=int(os.getenv(f"{prefix}_CIRCUIT_HALF_OPEN_CALLS", "1")),
+        )
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        self.state = state
+        CIRCUIT_STATE.labels(upstream=self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(upstream=self.name, state=state).inc()
+        if state == OPEN:
+            self.stats["opened"] += 1
+            self._opened_at = time.monotonic()
+            print(f"⚡ {self.name} circuit opened after {self._failures} consecutive failures")
+        elif state == CLOSED:
+            print(f"✅ {self.name} circuit closed")
+
+    def _short_circuit(self, retry_after: float):
+        self.stats["short_circuited"] += 1
+        CIRCUIT_REJECTED.labels(upstream=self.name).inc()
+        raise CircuitOpen(self.name, retry_after)
+
+    def allow(self):
+        """Admit a call or raise CircuitOpen."""
+        if self.state == OPEN:
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self._short_circuit(remaining)
+            self._transition(HALF_OPEN)
+            self._probes = 0
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_max_calls:
+                self._short_circuit(self.reset_timeout)
+            self._probes += 1
+
+    def record(self, success: Optional[bool]):
+        """Report the outcome of an allowed call."""
+        was_probe = self.state == HALF_OPEN
+        if was_probe:
+            self._probes = max(0, self._probes - 1)
+        if success is None:
+            return
+
+        if success:
+            self.stats["successes"] += 1
+            self._failures = 0
+            self._transition(CLOSED)
+        else:
+            self.stats["failures"] += 1
+            self._failures += 1
+            if was_probe or self._failures >= self.failure_threshold:
+                self._transition(OPEN)
+                # Re-arm the timer when a probe fails
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_timeout": self.reset_timeout,
+        }
@@ -0,0 +1,209 @@
+import os
+import json
+import asyncio
+import random
+import hashlib
+import importlib.util
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from admission import AdmissionController
+from circuit import CircuitBreaker
+from metrics import GRAPH_API_DURATION, span
+from ratelimit import RateLimiter
+
+# Status codes worth retrying: throttling and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Graph error codes for app / user / page / business use case rate limiting
+RATE_LIMIT_ERROR_CODES = {4, 17, 32, 613, 80001, 80002, 80004, 80005, 80006, 80008}
+
+# How long to back off after a throttling error that carries no timing hint
+DEFAULT_THROTTLE_PAUSE = 30.0
+
+
+def graph_error_code(response: httpx.Response) -> Optional[int]:
+    if response.status_code < 400:
+        return None
+    try:
+        return response.json().get("error", {}).get("code")
+    except (ValueError, AttributeError):
+        return None
+
+
+def is_rate_limit_error(response: httpx.Response) -> bool:
+    return response.status_code == 429 or graph_error_code(response) in RATE_LIMIT_ERROR_CODES
+
+
+def graph_quota_usage(response: httpx.Response) -> Tuple[Optional[float], float]:
+    """
+    Read X-App-Usage, X-Page-Usage and X-Business-Use-Case-Usage.
+    Returns (highest usage percentage or None, seconds until access is regained).
+    """
+    usage: Optional[float] = None
+    regain_seconds = 0.0
+    for header in ("X-App-Usage", "X-Page-Usage"):
+        raw = response.headers.get(header)
+        if raw:
+            try:
+                counters = json.loads(raw)
+                usage = max([usage or 0.0, *(float(v) for v in counters.values())])
+            except (ValueError, TypeError, AttributeError):
+                pass
+
+    raw = response.headers.get("X-Business-Use-Case-Usage")
+    if raw:
+        try:
+            for entries in json.loads(raw).values():
+                for entry in entries:
+                    counters = [entry.get(k, 0) for k in ("call_count", "total_cputime", "total_time")]
+                    usage = max([usage or 0.0, *(float(v) for v in counters)])
+                    # Graph reports this one in minutes
+                    regain_seconds = max(regain_seconds, float(entry.get("estimated_time_to_regain_access", 0)) * 60)
+        except (ValueError, TypeError, AttributeError):
+            pass
+    return usage, regain_seconds
+
+
+def retry_after_seconds(response: httpx.Response) -> float:
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", 0)))
+    except ValueError:
+        # HTTP-date form is not used by Graph; treat as no hint
+        return 0.0
+
+
+def rate_limit_key(params: Optional[Dict[str, Any]]) -> str:
+    """Quotas are tracked per access token; key buckets by a hash of it."""
+    token = (params or {}).get("access_token")
+    if not token:
+        return "app"
+    return hashlib.sha256(str(token).encode("utf-8")).hexdigest()[:12]
+
+
+class GraphHTTPClient:
+    """
+    Shared async HTTP client for graph.facebook.com.
+    Keeps a keep-alive connection pool (HTTP/2 when the h2 package is installed),
+    applies per-call timeouts and retries transient failures with exponential backoff.
+    Each attempt holds a slot in the "instagram" admission pool, so bursts queue
+    (or are rejected) here instead of tripping Graph API rate limits.
+    A per-token rate limiter paces calls, slows down as the X-App-Usage /
+    X-Business-Use-Case-Usage headers approach 100% and pauses on throttling errors.
+    """
+
+    def __init__(self, timeout: float = 10.0, max_retries: int = 2, backoff: float = 0.5,
+                 max_connections: int = 20, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 admission: Optional[AdmissionController] = None, rate_limiter: Optional[RateLimiter] = None,
+                 circuit: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.http2 = importlib.util.find_spec("h2") is not None
+        # Custom transport (e.g. a local stub for benchmarks) instead of the network
+        self.transport = transport
+        self.admission = admission or AdmissionController("instagram", max_connections)
+        self.rate_limiter = rate_limiter or RateLimiter("instagram", rate=0)
+        self.circuit = circuit or CircuitBreaker("instagram")
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls) -> "GraphHTTPClient":
+        return cls(
+            timeout=float(os.getenv("GRAPH_API_TIMEOUT", "10")),
+            max_retries=int(os.getenv("GRAPH_API_MAX_RETRIES", "2")),
+            backoff=float(os.getenv("GRAPH_API_RETRY_BACKOFF", "0.5")),
+            max_connections=int(os.getenv("GRAPH_API_MAX_CONNECTIONS", "20")),
+            admission=AdmissionController.from_env("instagram", "GRAPH_API", max_concurrent=10,
+                                                   max_queue=100, queue_timeout=10.0),
+            rate_limiter=RateLimiter.from_env("instagram", "GRAPH_API", rate=5.0, burst=20, max_wait=10.0),
+            circuit=CircuitBreaker.from_env("instagram", "GRAPH_API"),
+        )
+
+    async def start(self):
+        """Open the connection pool. Called on app startup."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+
+    async def aclose(self):
+        """Close the connection pool. Called on app shutdown."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str, params: Optional[Dict[str, Any]] = None,
+                  timeout: Optional[float] = None) -> httpx.Response:
+        """
+        GET with retry and backoff on transport errors, retryable status codes and
+        throttling errors. Returns the final response; non-retryable error statuses
+        are returned as-is. Raises RateLimited when the quota wait is too long and
+        CircuitOpen while the Graph API is considered down.
+        """
+        if self._client is None:
+            await self.start()
+
+        # Cursor URLs (paging.next) carry fields, cursors and the access token in their
+        # query: move them into params so the rate limiter keys on the token, and label
+        # metrics by path only so neither tokens nor cursors end up in /metrics
+        request_url = httpx.URL(url)
+        if request_url.query:
+            params = {**dict(request_url.params), **(params or {})}
+            request_url = request_url.copy_with(query=None)
+            url = str(request_url)
+
+        self.circuit.allow()
+        healthy = None
+        try:
+            with span("graph_api", GRAPH_API_DURATION, endpoint=request_url.path.strip("/").rsplit("/", 1)[-1]):
+                response = await self._get_with_retry(url, params, timeout)
+            # 4xx (bad token, throttling) is not an outage; 5xx after retries is
+            healthy = response.status_code < 500
+            return response
+        except httpx.TransportError:
+            healthy = False
+            raise
+        finally:
+            self.circuit.record(healthy)
+
+    async def _get_with_retry(self, url: str, params: Optional[Dict[str, Any]],
+                              timeout: Optional[float]) -> httpx.Response:
+        key = rate_limit_key(params)
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(key)
+            try:
+                async with self.admission.slot():
+                    response = await self._client.get(url, params=params, timeout=timeout or self.timeout)
+                throttled = self._observe_quota(key, response)
+                retryable = throttled or response.status_code in RETRYABLE_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    return response
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+
+            attempt += 1
+            delay = self.backoff * (2 ** (attempt - 1))
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+
+    def _observe_quota(self, key: str, response: httpx.Response) -> bool:
+        """Feed usage headers to the rate limiter; returns True if the call was throttled."""
+        usage, regain_seconds = graph_quota_usage(response)
+        if usage is not None:
+            self.rate_limiter.observe_usage(key, usage)
+
+        throttled = is_rate_limit_error(response)
+        pause = max(retry_after_seconds(response), regain_seconds)
+        if throttled or pause:
+            self.rate_limiter.pause(key, pause or DEFAULT_THROTTLE_PAUSE)
+        return throttled
@@ -0,0 +1,146 @@
+import os
+import mmap
+import time
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+
+@dataclass
+class CachedImage:
+    """Index entry for a previously fetched image URL."""
+    content_hash: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    checked_at: float
+
+
+class ImageCache:
+    """
+    Content-addressed, size-bounded disk store for downscaled thumbnails.
+
+    Thumbnails are kept as raw RGB files named by the hash of the original
+    image bytes and read back through mmap. A SQLite index maps URLs to
+    content hashes plus their ETag / Last-Modified validators. Entries checked
+    within `fresh_ttl` are served without any network request; older ones are
+    revalidated with a conditional GET. Least recently used thumbnails are
+    evicted once the store exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, fresh_ttl: float = 86400.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fresh_ttl = fresh_ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails ("
+            " content_hash TEXT PRIMARY KEY, width INTEGER NOT NULL, height INTEGER NOT NULL,"
+            " size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS urls ("
+            " url TEXT PRIMARY KEY, content_hash TEXT NOT NULL, etag TEXT,"
+            " last_modified TEXT, checked_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> Optional["ImageCache"]:
+        """Build the cache when IMAGE_CACHE_DIR is set, otherwise return None."""
+        directory = os.getenv("IMAGE_CACHE_DIR")
+        if not directory:
+            return None
+        return cls(
+            directory,
+            max_bytes=int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            fresh_ttl=float(os.getenv("IMAGE_CACHE_FRESH_TTL", "86400")),
+        )
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.rgb")
+
+    def lookup(self, url: str) -> Optional[CachedImage]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash, etag, last_modified, checked_at FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        return CachedImage(*row) if row else None
+
+    def is_fresh(self, entry: CachedImage) -> bool:
+        return time.time() - entry.checked_at < self.fresh_ttl
+
+    def load(self, content_hash: str) -> Optional[Image.Image]:
+        """Read a stored thumbnail through mmap, or None if it was evicted."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT width, height FROM thumbnails WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE thumbnails SET accessed_at = ? WHERE content_hash = ?", (time.time(), content_hash)
+            )
+            self._db.commit()
+        try:
+            with open(self._path(content_hash), "rb") as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return Image.frombytes("RGB", (row[0], row[1]), mapped)
+        except (OSError, ValueError):
+            return None
+
+    def mark_checked(self, url: str):
+        """Record a successful revalidation (304 Not Modified)."""
+        with self._lock:
+            self._db.execute("UPDATE urls SET checked_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def store(self, url: str, content_hash: str, image: Image.Image,
+              etag: Optional[str] = None, last_modified: Optional[str] = None):
+        data = image.convert("RGB").tobytes()
+        now = time.time()
+        with self._lock:
+            path = self._path(content_hash)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            self._db.execute(
+                "INSERT OR REPLACE INTO thumbnails (content_hash, width, height, size, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (content_hash, image.width, image.height, len(data), now),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO urls (url, content_hash, etag, last_modified, checked_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (url, content_hash, etag, last_modified, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for content_hash, size in self._db.execute(
+            "SELECT content_hash, size FROM thumbnails ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM thumbnails WHERE content_hash = ?", (content_hash,))
+            self._db.execute("DELETE FROM urls WHERE content_hash = ?", (content_hash,))
+            try:
+                os.remove(self._path(content_hash))
+            except OSError:
+                pass
+            total -= size
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,131 @@
+import os
+import asyncio
+import hashlib
+from io import BytesIO
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+from PIL import Image
+
+from image_cache import ImageCache
+
+
+@dataclass
+class Thumbnail:
+    """A downloaded post image, decoded and downscaled for analysis."""
+    url: str
+    image: Image.Image
+    content_hash: str
+
+
+def decode_thumbnail(data: bytes, size: int = 256) -> Image.Image:
+    """
+    Decode image bytes and downscale to fit within size x size (RGB).
+    Uses JPEG draft mode so large photos are decoded at reduced resolution.
+    """
+    image = Image.open(BytesIO(data))
+    image.draft("RGB", (size, size))
+    image = image.convert("RGB")
+    image.thumbnail((size, size))
+    return image
+
+
+class ImageFetcher:
+    """
+    Downloads post images concurrently over a pooled HTTP client and decodes
+    them into thumbnails on a worker thread so the event loop is never blocked.
+    With an ImageCache, repeat fetches are served from disk and revalidated
+    with conditional requests.
+    """
+
+    def __init__(self, thumbnail_size: int = 256, timeout: float = 10.0,
+                 max_bytes: int = 10 * 1024 * 1024, max_connections: int = 20,
+                 cache: Optional[ImageCache] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.thumbnail_size = thumbnail_size
+        self.cache = cache
+        self.transport = transport
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_connections = max_connections
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @classmethod
+    def from_env(cls) -> "ImageFetcher":
+        return cls(
+            thumbnail_size=int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256")),
+            timeout=float(os.getenv("IMAGE_FETCH_TIMEOUT", "10")),
+            max_bytes=int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024))),
+            cache=ImageCache.from_env(),
+        )
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=self.max_connections),
+            )
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self.cache is not None:
+            self.cache.close()
+
+    async def _get(self, url: str, headers: Optional[dict] = None) -> httpx.Response:
+        if self._client is None:
+            await self.start()
+        return await self._client.get(url, headers=headers)
+
+    async def fetch_thumbnail(self, url: str) -> Thumbnail:
+        entry = None
+        headers = {}
+        if self.cache is not None:
+            entry = await asyncio.to_thread(self.cache.lookup, url)
+            if entry is not None:
+                if self.cache.is_fresh(entry):
+                    image = await asyncio.to_thread(self.cache.load, entry.content_hash)
+                    if image is not None:
+                        return Thumbnail(url=url, image=image, content_hash=entry.content_hash)
+                if entry.etag:
+                    headers["If-None-Match"] = entry.etag
+                if entry.last_modified:
+                    headers["If-Modified-Since"] = entry.last_modified
+        
+        response = await self._get(url, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            image = await asyncio.to_thread(self.cache.load, entry.content_hash)
+            if image is not None:
+                await asyncio.to_thread(self.cache.mark_checked, url)
+                return Thumbnail(url=url, image=image, content_hash=entry.content_hash)
+            # Thumbnail was evicted between lookup and load: fetch it unconditionally
+            response = await self._get(url)
+        
+        response.raise_for_status()
+        data = response.content
+        if len(data) > self.max_bytes:
+            raise ValueError(f"image larger than {self.max_bytes} bytes")
+        
+        content_hash = hashlib.sha256(data).hexdigest()
+        image = await asyncio.to_thread(decode_thumbnail, data, self.thumbnail_size)
+        if self.cache is not None:
+            await asyncio.to_thread(
+                self.cache.store, url, content_hash, image,
+                response.headers.get("ETag"), response.headers.get("Last-Modified")
+            )
+        return Thumbnail(url=url, image=image, content_hash=content_hash)
+
+    async def fetch_thumbnails(self, urls: List[str]) -> List[Thumbnail]:
+        """Fetch and decode all images concurrently, skipping any that fail."""
+        results = await asyncio.gather(*[self.fetch_thumbnail(url) for url in urls],
+                                       return_exceptions=True)
+        thumbnails = []
+        for url, result in zip(urls, results):
+            if isinstance(result, Exception):
+                print(f"Image fetch failed for {url}: {result}")
+                continue
+            thumbnails.append(result)
+        return thumbnails
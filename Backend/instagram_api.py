@@ -1,24 +1,118 @@
 import os
-import requests
-from typing import Dict, List, Any, Optional
+import time
+import asyncio
+import httpx
+from typing import Dict, List, Any, Optional, AsyncIterator, Callable, Tuple
 from urllib.parse import urlencode
 import json
 import random
+from datetime import datetime
+from http_client import GraphHTTPClient, RATE_LIMIT_ERROR_CODES
+from ratelimit import RateLimited
+
+
+def is_auth_error(response: httpx.Response) -> bool:
+    """
+    Whether a Graph API response is an OAuth error (expired/invalid token).
+    Graph reports these as HTTP 400/401 with error type OAuthException and code 190.
+    Rate limit errors share the OAuthException type but are not auth failures.
+    """
+    if response.status_code < 400:
+        return False
+    try:
+        error = response.json().get("error", {})
+    except ValueError:
+        return False
+    if error.get("code") in RATE_LIMIT_ERROR_CODES:
+        return False
+    return error.get("code") == 190 or error.get("type") == "OAuthException"
+
+
+class TokenStateCache:
+    """
+    Caches the result of Page Access Token validation for a TTL so the /me
+    round trip is not paid on every profile fetch.
+    Only definitive results are cached; transient network failures are not.
+    """
+
+    def __init__(self, ttl: float = 600.0):
+        self.ttl = ttl
+        self.lock = asyncio.Lock()
+        self._token: Optional[str] = None
+        self._state: Optional[Dict[str, Any]] = None
+        self._expires_at = 0.0
+
+    @property
+    def refresh_interval(self) -> float:
+        # Refresh ahead of expiry so requests never see a cold cache
+        return self.ttl * 0.8
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        if self._state is None or self._token != token or time.monotonic() >= self._expires_at:
+            return None
+        return self._state
+
+    def set(self, token: str, state: Dict[str, Any]):
+        if not state.get("valid") and "status_code" not in state:
+            return
+        self._token = token
+        self._state = state
+        self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        self._state = None
+        self._expires_at = 0.0
+
+
+
+def media_timestamp(value: Optional[str]) -> Optional[float]:
+    """Parse a Graph API timestamp ("2024-05-01T12:00:00+0000") to epoch seconds."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    except ValueError:
+        return None
+
+
+def format_media_post(media: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a Graph API media item to the post structure used by the pipeline."""
+    return {
+        "id": media.get("id"),
+        "caption": media.get("caption", ""),
+        "url": media.get("permalink"),
+        "image_url": media.get("media_url") or media.get("thumbnail_url"),
+        "media_type": media.get("media_type", "IMAGE"),
+        "timestamp": media.get("timestamp"),
+        "likes": media.get("like_count", 0),
+        "comments": media.get("comments_count", 0)
+    }
+
 
 class InstagramBusinessAPI:
     """
     Instagram Business API integration for accessing business account data.
     This provides access to public business profiles and their media.
+    One instance is created per process at app startup; it owns the Graph API
+    connection pool, the token state cache and the env configuration.
     """
     
-    def __init__(self):
+    def __init__(self, http_client: Optional[GraphHTTPClient] = None,
+                 token_cache: Optional[TokenStateCache] = None):
         self.app_id = os.getenv("INSTAGRAM_APP_ID")
         self.app_secret = os.getenv("INSTAGRAM_APP_SECRET")
         self.page_access_token = os.getenv("INSTAGRAM_PAGE_ACCESS_TOKEN")
         self.business_account_id = os.getenv("INSTAGRAM_BUSINESS_ACCOUNT_ID")
         self.base_url = "https://graph.facebook.com/v18.0"
+        self.http = http_client or GraphHTTPClient.from_env()
+        self.token_cache = token_cache or TokenStateCache(
+            ttl=float(os.getenv("INSTAGRAM_TOKEN_CACHE_TTL", "600"))
+        )
+        # Posts requested per Graph API page when following paging cursors
+        self.page_size = int(os.getenv("GRAPH_API_PAGE_SIZE", "25"))
+        self._token_refresh_task: Optional[asyncio.Task] = None
         
-    def validate_page_access_token(self) -> Dict[str, Any]:
+    async def validate_page_access_token(self) -> Dict[str, Any]:
         """
         Validate the Page Access Token and check its permissions.
         Returns validation status and token info.
@@ -38,9 +132,9 @@ class InstagramBusinessAPI:
                 "fields": "id,name"
             }
             
-            response = requests.get(url, params=params)
+            response = await self.http.get(url, params=params)
             
-            if response.status_code == 190:
+            if is_auth_error(response):
                 return {
                     "valid": False,
                     "error": "Invalid or expired access token",
@@ -64,65 +158,64 @@ class InstagramBusinessAPI:
                 "message": f"Token valid for: {token_info.get('name', 'Unknown')}"
             }
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {
                 "valid": False,
                 "error": f"Token validation failed: {str(e)}",
                 "suggestion": "Check internet connection and token format"
             }
-        
-    def validate_page_access_token(self) -> Dict[str, Any]:
+    
+    async def start(self):
+        """Open the connection pool and start background token refresh."""
+        await self.http.start()
+        self.start_token_refresh()
+    
+    async def aclose(self):
+        """Stop background work and close the connection pool."""
+        await self.stop_token_refresh()
+        await self.http.aclose()
+    
+    async def get_token_state(self, force_refresh: bool = False) -> Dict[str, Any]:
         """
-        Validate the Page Access Token and check its permissions.
-        Returns validation status and token info.
+        Return the cached token validation result, validating against /me only
+        when the cache is empty, expired or a refresh is forced.
         """
-        if not self.page_access_token:
-            return {
-                "valid": False,
-                "error": "No page access token configured",
-                "suggestion": "Add INSTAGRAM_PAGE_ACCESS_TOKEN to .env file"
-            }
+        if not force_refresh:
+            state = self.token_cache.get(self.page_access_token)
+            if state is not None:
+                return state
         
-        try:
-            # Test the token by making a simple API call
-            url = f"{self.base_url}/me"
-            params = {
-                "access_token": self.page_access_token,
-                "fields": "id,name"
-            }
-            
-            response = requests.get(url, params=params)
-            
-            if response.status_code == 190:
-                return {
-                    "valid": False,
-                    "error": "Invalid or expired access token",
-                    "suggestion": "Generate a new Page Access Token from Facebook Graph API Explorer",
-                    "status_code": 190
-                }
-            elif response.status_code == 403:
-                return {
-                    "valid": False, 
-                    "error": "Token lacks required permissions",
-                    "suggestion": "Ensure token has pages_read_engagement and instagram_basic permissions",
-                    "status_code": 403
-                }
-            
-            response.raise_for_status()
-            token_info = response.json()
-            
-            return {
-                "valid": True,
-                "token_info": token_info,
-                "message": f"Token valid for: {token_info.get('name', 'Unknown')}"
-            }
-            
-        except requests.exceptions.RequestException as e:
-            return {
-                "valid": False,
-                "error": f"Token validation failed: {str(e)}",
-                "suggestion": "Check internet connection and token format"
-            }
+        async with self.token_cache.lock:
+            # Another request may have refreshed while we waited for the lock
+            state = None if force_refresh else self.token_cache.get(self.page_access_token)
+            if state is None:
+                state = await self.validate_page_access_token()
+                self.token_cache.set(self.page_access_token, state)
+            return state
+    
+    def start_token_refresh(self):
+        """Start proactively re-validating the token in the background."""
+        if self.page_access_token and self._token_refresh_task is None:
+            self._token_refresh_task = asyncio.create_task(self._refresh_token_loop())
+    
+    async def stop_token_refresh(self):
+        if self._token_refresh_task is not None:
+            self._token_refresh_task.cancel()
+            try:
+                await self._token_refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._token_refresh_task = None
+    
+    async def _refresh_token_loop(self):
+        while True:
+            try:
+                await self.get_token_state(force_refresh=True)
+            except Exception as e:
+                print(f"Background token refresh failed: {e}")
+            await asyncio.sleep(self.token_cache.refresh_interval)
+    
+    async def get_app_access_token(self) -> Optional[str]:
         """
         Get app access token for Instagram Business API.
         This token allows access to public business account data.
@@ -135,7 +228,7 @@ class InstagramBusinessAPI:
                 "grant_type": "client_credentials"
             }
             
-            response = requests.get(url, params=params)
+            response = await self.http.get(url, params=params)
             response.raise_for_status()
             
             token_data = response.json()
@@ -164,40 +257,125 @@ class InstagramBusinessAPI:
             print(f"Business account search failed: {e}")
             return None
     
-    def get_instagram_business_media(self, user_id: str, access_token: str, limit: int = 12) -> List[Dict[str, Any]]:
+    async def _fetch_media_page(self, url: str, params: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Fetch one page of media; returns (items, next page URL or None)."""
+        response = await self.http.get(url, params=params)
+        if is_auth_error(response):
+            # Token was revoked or expired since it was cached
+            self.token_cache.invalidate()
+        response.raise_for_status()
+        
+        body = response.json()
+        return body.get("data", []), body.get("paging", {}).get("next")
+    
+    async def iter_business_media(self, user_id: str, access_token: str, max_posts: int = 12,
+                                  since: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
         """
-        Get media from Instagram Business account.
+        Yield pages of media from an Instagram Business account, following
+        paging.next cursors until max_posts items have been produced.
+        The next page is requested before the current one is yielded, so the
+        caller's processing overlaps with the network round trip.
+        With `since` (a media timestamp) only newer media is produced; media
+        comes newest first, so paging stops at the first older item.
         """
+        url = f"{self.base_url}/{user_id}/media"
+        params = {
+            "fields": "id,caption,media_type,media_url,permalink,thumbnail_url,timestamp,like_count,comments_count",
+            "limit": min(max_posts, self.page_size),
+            "access_token": access_token
+        }
+        since_ts = media_timestamp(since)
+        if since_ts is not None:
+            params["since"] = int(since_ts)
+        
+        remaining = max_posts
+        next_page: Optional[asyncio.Task] = asyncio.create_task(self._fetch_media_page(url, params))
         try:
-            url = f"{self.base_url}/{user_id}/media"
-            params = {
-                "fields": "id,caption,media_type,media_url,permalink,thumbnail_url,timestamp,like_count,comments_count",
-                "limit": limit,
-                "access_token": access_token
-            }
-            
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            
-            return response.json().get("data", [])
+            while next_page is not None:
+                items, next_url = await next_page
+                next_page = None
+                reached_since = False
+                if since_ts is not None:
+                    fresh = [item for item in items if (media_timestamp(item.get("timestamp")) or 0) > since_ts]
+                    reached_since = len(fresh) < len(items)
+                    items = fresh
+                items = items[:remaining]
+                remaining -= len(items)
+                if next_url and items and remaining > 0 and not reached_since:
+                    # The cursor URL already carries fields, limit and token
+                    next_page = asyncio.create_task(self._fetch_media_page(next_url, None))
+                if items:
+                    yield items
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+    
+    async def get_instagram_business_media(self, user_id: str, access_token: str, limit: int = 12,
+                                           on_page: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                           since: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Get up to `limit` media items from an Instagram Business account,
+        only those newer than `since` when given. Returns (media, complete).
+        on_page is called with each page as it arrives. If a page fails, the
+        pages fetched so far are returned with complete=False: callers must not
+        treat them as the whole (incremental) result.
+        """
+        media: List[Dict[str, Any]] = []
+        try:
+            async for page in self.iter_business_media(user_id, access_token, limit, since):
+                media.extend(page)
+                if on_page is not None:
+                    on_page(page)
             
+        except RateLimited as e:
+            print(f"Business media fetch stopped, Graph API quota exhausted: {e}")
+            return media, False
         except Exception as e:
             print(f"Business media fetch failed: {e}")
-            return []
+            return media, False
+        return media, True
+    
+    async def get_media_urls(self, media_ids: List[str]) -> Dict[str, str]:
+        """
+        Current image URLs for already-known media IDs, in one multi-ID request.
+        media_url values are signed CDN links that expire, so posts kept between
+        refreshes have theirs re-read instead of reusing stored ones.
+        """
+        urls: Dict[str, str] = {}
+        # Graph accepts at most 50 IDs per multi-ID lookup
+        for start in range(0, len(media_ids), 50):
+            response = await self.http.get(f"{self.base_url}/", params={
+                "ids": ",".join(media_ids[start:start + 50]),
+                "fields": "media_url,thumbnail_url",
+                "access_token": self.page_access_token,
+            })
+            if is_auth_error(response):
+                self.token_cache.invalidate()
+            response.raise_for_status()
+            for media_id, media in response.json().items():
+                url = media.get("media_url") or media.get("thumbnail_url")
+                if url:
+                    urls[media_id] = url
+        return urls
     
-    async def get_business_account_data(self, username: str, max_posts: int = 12) -> Optional[Dict[str, Any]]:
+    async def get_business_account_data(self, username: str, max_posts: int = 12,
+                                        on_page: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                        since: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Get Instagram Business account data.
         First tries using configured business account, then attempts search.
+        on_page receives each page of formatted posts as soon as it is fetched.
+        With `since`, only posts newer than that timestamp are returned (possibly none).
+        The result's "complete" is False when a media page failed part way.
         """
         try:
             # Method 1: Use configured page access token and business account ID
             if self.page_access_token and self.business_account_id:
                 print(f"Using configured Instagram Business Account for @{username}...")
-                return await self._get_configured_business_data(username, max_posts)
+                return await self._get_configured_business_data(username, max_posts, on_page, since)
             
             # Method 2: Try with app access token (limited functionality)
-            access_token = self.get_app_access_token()
+            access_token = await self.get_app_access_token()
             if access_token:
                 print(f"Attempting Instagram Business API search for @{username}...")
                 return await self._search_business_account(username, access_token, max_posts)
@@ -209,13 +387,15 @@ class InstagramBusinessAPI:
             print(f"Instagram Business API failed: {e}")
             return None
     
-    async def _get_configured_business_data(self, username: str, max_posts: int) -> Optional[Dict[str, Any]]:
+    async def _get_configured_business_data(self, username: str, max_posts: int,
+                                            on_page: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                            since: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Get data from a pre-configured Instagram Business account.
         """
         try:
-            # First validate the access token
-            validation_result = self.validate_page_access_token()
+            # First validate the access token (cached between requests)
+            validation_result = await self.get_token_state()
             if not validation_result["valid"]:
                 print(f"❌ Instagram API Token Error: {validation_result['error']}")
                 print(f"💡 Solution: {validation_result['suggestion']}")
@@ -225,36 +405,34 @@ class InstagramBusinessAPI:
             
             print(f"✅ Instagram API Token Valid: {validation_result['message']}")
             
-            # Try to get media data
-            media_data = self.get_instagram_business_media(
+            # Fetch media page by page, handing each formatted page to the caller as it lands
+            posts_data = []
+            def handle_page(media_page: List[Dict[str, Any]]):
+                page_posts = [format_media_post(media) for media in media_page]
+                posts_data.extend(page_posts)
+                if on_page is not None:
+                    on_page(page_posts)
+            
+            _, complete = await self.get_instagram_business_media(
                 self.business_account_id, 
                 self.page_access_token, 
-                max_posts
+                max_posts,
+                on_page=handle_page,
+                since=since
             )
             
-            if not media_data:
+            # No posts since the watermark is a valid (empty) incremental result,
+            # but only if the fetch actually completed
+            if not posts_data and since is None:
                 print("⚠️ No media data returned from Instagram Business API")
                 return None
             
-            # Format data to match expected structure
-            posts_data = []
-            for media in media_data:
-                post_data = {
-                    "caption": media.get("caption", ""),
-                    "url": media.get("permalink"),
-                    "image_url": media.get("media_url") or media.get("thumbnail_url"),
-                    "media_type": media.get("media_type", "IMAGE"),
-                    "timestamp": media.get("timestamp"),
-                    "likes": media.get("like_count", 0),
-                    "comments": media.get("comments_count", 0)
-                }
-                posts_data.append(post_data)
-            
             return {
                 "username": username,
                 "bio": f"Instagram Business profile for @{username}",
                 "posts": posts_data,
                 "source": "instagram_business_api",
+                "complete": complete,
                 "note": f"Real data from Instagram Business API for @{username}"
             }
             
@@ -309,10 +487,18 @@ def get_enhanced_demo_data(username: str, max_posts: int = 12) -> Dict[str, Any]
         "note": f"🔧 Using enhanced demo data for @{username}. Instagram API credentials are configured but user authorization required for real posts."
     }
 
-async def get_instagram_profile_data(username: str = None, max_posts: int = 12) -> Dict[str, Any]:
+async def get_instagram_profile_data(username: Optional[str], business_api: InstagramBusinessAPI,
+                                     max_posts: int = 12,
+                                     on_page: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                     since: Optional[str] = None) -> Dict[str, Any]:
     """
     Get Instagram profile data using Instagram Business API or enhanced demo content.
     Tries Business API first, then falls back to enhanced demo data.
+    business_api is the shared client, so its connection pool and token cache are
+    reused across requests; on_page receives each page of real posts while later
+    pages are fetched.
+    With `since`, real data only contains posts newer than that media timestamp
+    (demo data is always complete).
     """
     if not username:
         return get_enhanced_demo_data("demo_user", max_posts)
@@ -331,10 +517,9 @@ async def get_instagram_profile_data(username: str = None, max_posts: int = 12)
     username = username.lstrip('@')
     
     # Try Instagram Business API first
-    business_api = InstagramBusinessAPI()
     if business_api.app_id and business_api.app_secret:
         print(f"Attempting to fetch Instagram Business data for @{username}...")
-        business_data = await business_api.get_business_account_data(username, max_posts)
+        business_data = await business_api.get_business_account_data(username, max_posts, on_page, since)
         if business_data:
             return business_data
     
@@ -0,0 +1,337 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import ipaddress
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import httpx
+
+from metrics import JOB_QUEUE_DEPTH, JOB_RUN_DURATION, JOBS_FINISHED
+
+# Lower runs first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+FINISHED_STATUSES = {"succeeded", "failed", "cancelled"}
+
+
+class JobQueueFull(Exception):
+    """Raised by submit() when the queue is at capacity."""
+
+
+class CallbackRejected(ValueError):
+    """Raised for a callback_url the server must not POST to."""
+
+
+class MemoryJobStore:
+    """In-process job store; finished jobs are dropped after `ttl` seconds."""
+
+    def __init__(self, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    async def save(self, job: Dict[str, Any]):
+        self._jobs[job["id"]] = job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    async def unfinished(self) -> List[Dict[str, Any]]:
+        return [job for job in self._jobs.values() if job["status"] not in FINISHED_STATUSES]
+
+    async def prune(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in FINISHED_STATUSES and job["finished_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def close(self):
+        pass
+
+
+class SQLiteJobStore:
+    """
+    Job store in a local SQLite file, so jobs survive restarts: anything still
+    queued or running when the process stopped is picked up again on start.
+    Queries run in a worker thread so they never block the event loop.
+    """
+
+    def __init__(self, db_path: str, ttl: float = 3600.0):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, finished_at REAL, data TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    async def save(self, job: Dict[str, Any]):
+        # Serialized on the loop so the stored row is the job as it is now
+        await asyncio.to_thread(self._save, job["id"], job["status"], job.get("finished_at"), json.dumps(job))
+
+    def _save(self, job_id: str, status: str, finished_at: Optional[float], data: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO jobs (id, status, finished_at, data) VALUES (?, ?, ?, ?)",
+                (job_id, status, finished_at, data),
+            )
+            self._db.commit()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def unfinished(self) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._unfinished)
+
+    def _unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    async def prune(self):
+        await asyncio.to_thread(self._prune)
+
+    def _prune(self):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                (time.time() - self.ttl,),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class JobWorkerPool:
+    """
+    Runs submitted jobs on a fixed number of asyncio workers, highest priority
+    first (FIFO within a priority). Job state lives in the store, so results can
+    be polled by ID; a job with a callback_url gets its final state POSTed there.
+    Callbacks go only to `callback_hosts` when set, otherwise to any host that
+    doesn't resolve to a loopback, private, link-local or reserved address.
+    """
+
+    def __init__(self, store, handler: Callable[[Dict[str, Any]], Awaitable[Any]], workers: int = 4,
+                 max_queue: int = 1000, callback_timeout: float = 10.0,
+                 callback_hosts: Optional[Set[str]] = None):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.callback_timeout = callback_timeout
+        self.callback_hosts = callback_hosts
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        # Queued jobs not yet cancelled; cancelled entries linger in the PriorityQueue until dequeued
+        self._queued: Set[str] = set()
+        self._cancel_requested = set()
+        self._http: Optional[httpx.AsyncClient] = None
+        self._callbacks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_env(cls, handler: Callable[[Dict[str, Any]], Awaitable[Any]]) -> "JobWorkerPool":
+        ttl = float(os.getenv("VIBECHECK_JOB_TTL", "3600"))
+        db_path = os.getenv("VIBECHECK_JOB_DB")
+        store = SQLiteJobStore(db_path, ttl) if db_path else MemoryJobStore(ttl)
+        hosts = {host.strip().lower() for host in os.getenv("VIBECHECK_JOB_CALLBACK_HOSTS", "").split(",") if host.strip()}
+        return cls(
+            store,
+            handler,
+            workers=int(os.getenv("VIBECHECK_JOB_WORKERS", "4")),
+            max_queue=int(os.getenv("VIBECHECK_JOB_MAX_QUEUE", "1000")),
+            callback_timeout=float(os.getenv("VIBECHECK_JOB_CALLBACK_TIMEOUT", "10")),
+            callback_hosts=hosts or None,
+        )
+
+    async def start(self):
+        """Start the workers and re-queue jobs a previous process left unfinished."""
+        self._queue = asyncio.PriorityQueue()
+        self._queued = set()
+        self._http = httpx.AsyncClient(timeout=self.callback_timeout)
+        for job in sorted(await self.store.unfinished(), key=lambda job: job["created_at"]):
+            job["status"] = "queued"
+            await self.store.save(job)
+            self._enqueue(job)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for task in self._callbacks:
+            task.cancel()
+        await asyncio.gather(*self._callbacks, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        self.store.close()
+
+    def _enqueue(self, job: Dict[str, Any]):
+        self._queue.put_nowait((PRIORITIES[job["priority"]], next(self._sequence), job["id"]))
+        self._queued.add(job["id"])
+        JOB_QUEUE_DEPTH.set(len(self._queued))
+
+    async def check_callback_url(self, url: str):
+        """Raise CallbackRejected unless `url` is an http(s) URL on an allowed, public host."""
+        try:
+            parsed = httpx.URL(url)
+        except httpx.InvalidURL as e:
+            raise CallbackRejected(f"invalid callback_url: {e}")
+        host = (parsed.host or "").lower()
+        if parsed.scheme not in ("http", "https") or not host:
+            raise CallbackRejected("callback_url must be an http(s) URL")
+        if self.callback_hosts is not None:
+            if host not in self.callback_hosts:
+                raise CallbackRejected(f"callback host {host} is not allowed")
+            return
+
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(
+                host, parsed.port or (443 if parsed.scheme == "https" else 80), type=socket.SOCK_STREAM
+            )
+        except socket.gaierror:
+            raise CallbackRejected(f"callback host {host} does not resolve")
+        for info in infos:
+            address = ipaddress.ip_address(info[4][0].split("%", 1)[0])
+            if not address.is_global or address.is_multicast:
+                raise CallbackRejected(f"callback host {host} resolves to a non-public address")
+
+    async def submit(self, request: Dict[str, Any], priority: str = "normal",
+                     callback_url: Optional[str] = None) -> Dict[str, Any]:
+        if len(self._queued) >= self.max_queue:
+            raise JobQueueFull(f"job queue is full ({self.max_queue} jobs)")
+        await self.store.prune()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": "queued",
+            "priority": priority,
+            "request": request,
+            "callback_url": callback_url,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        await self.store.save(job)
+        self._enqueue(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.store.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job. Returns the job, or None if unknown."""
+        job = await self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATUSES:
+            return job
+        # Running jobs record the cancellation when their task unwinds; queued ones
+        # are skipped by the worker that dequeues them, even mid store read
+        self._cancel_requested.add(job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            return job
+        self._queued.discard(job_id)
+        JOB_QUEUE_DEPTH.set(len(self._queued))
+        await self._finish(job, "cancelled")
+        return job
+
+    async def _finish(self, job: Dict[str, Any], status: str, result: Any = None, error: Optional[str] = None):
+        job.update(status=status, result=result, error=error, finished_at=time.time())
+        await self.store.save(job)
+        JOBS_FINISHED.labels(status=status).inc()
+        if job.get("started_at"):
+            JOB_RUN_DURATION.observe(job["finished_at"] - job["started_at"])
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            JOB_QUEUE_DEPTH.set(len(self._queued))
+            job = await self.store.get(job_id)
+            if job is None or job["status"] != "queued" or job_id in self._cancel_requested:
+                # Cancelled (or pruned) while waiting
+                self._cancel_requested.discard(job_id)
+                continue
+
+            # Registered before any await so cancel() always finds the running task
+            job.update(status="running", started_at=time.time())
+            task = asyncio.create_task(self.handler(job["request"]))
+            self._running[job_id] = task
+            try:
+                await self.store.save(job)
+                result = await task
+                await self._finish(job, "succeeded", result=result)
+            except asyncio.CancelledError:
+                if job_id not in self._cancel_requested:
+                    # The pool is stopping; a SQLite-backed job is resumed on next start
+                    task.cancel()
+                    raise
+                await self._finish(job, "cancelled")
+            except Exception as e:
+                print(f"Job {job_id} failed: {e}")
+                await self._finish(job, "failed", error=str(e))
+            finally:
+                self._running.pop(job_id, None)
+                self._cancel_requested.discard(job_id)
+
+            if job.get("callback_url"):
+                # A slow callback endpoint must not hold up the worker
+                task = asyncio.create_task(self._notify(job))
+                self._callbacks.add(task)
+                task.add_done_callback(self._callbacks.discard)
+
+    async def _notify(self, job: Dict[str, Any]):
+        try:
+            # Checked again at send time: DNS may have changed since the job was submitted
+            await self.check_callback_url(job["callback_url"])
+            response = await self._http.post(job["callback_url"], json=public_job(job))
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Job {job['id']} callback to {job['callback_url']} failed: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": len(self._queued),
+            "running": len(self._running),
+            "callbacks": len(self._callbacks),
+            "max_queue": self.max_queue,
+            "store": type(self.store).__name__,
+        }
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Job representation returned by the API and sent to callbacks."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "request": job["request"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"],
+    }
@@ -0,0 +1,200 @@
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from metrics import LLM_PARSE_DURATION, LLM_PARSE_RESULTS, span
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib parser
+    orjson = None
+
+
+# ---- Response schemas ----
+
+# Fields the pipeline can't do without are required, so an off-schema reply
+# (e.g. {"error": "quota"}) fails validation and takes the fallback path
+
+class TextAnalysis(BaseModel):
+    dominant_sentiment: str
+    topics: List[str]
+    style: str = "authentic"
+    keywords: List[str] = []
+
+
+class VibeProfileText(BaseModel):
+    summary: str
+    tagline: Optional[str] = None
+
+
+class MemeText(BaseModel):
+    caption: str
+    meme_text: str
+
+
+class ImageDescription(BaseModel):
+    mood: Optional[str] = None
+    objects: Optional[List[str]] = None
+    description: str
+
+
+class FusedGeneration(BaseModel):
+    """Schema for the fused profile + memes reply."""
+    summary: str
+    tagline: str
+    memes: List[MemeText]
+
+
+class FullyFusedGeneration(FusedGeneration):
+    """Schema for the fully fused reply, which also carries the caption analysis."""
+    dominant_sentiment: str
+    topics: List[str]
+    style: str
+    keywords: List[str]
+
+
+class LLMParseError(ValueError):
+    """Raised when an LLM reply cannot be turned into the expected schema."""
+
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+def _loads(text: str) -> Any:
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+
+def strip_json_fences(text: str) -> str:
+    text = text.strip()
+    if "```json" in text:
+        return text.split("```json", 1)[1].split("```")[0].strip()
+    if text.startswith("```"):
+        return text.split("```")[1].strip()
+    return text
+
+
+def _close_truncated(text: str) -> List[str]:
+    """
+    Candidate repairs for a reply that was cut off mid-JSON: close any open
+    string and brackets, first at the end and then at each earlier element
+    boundary (last one first).
+    """
+    stack = []
+    in_string = escaped = False
+    boundaries: List[Tuple[int, str]] = []
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+        elif char == "," and stack:
+            boundaries.append((index, "".join(reversed(stack))))
+
+    candidates = []
+    if stack or in_string:
+        tail = text + ('"' if in_string else "")
+        candidates.append(tail.rstrip().rstrip(",:") + "".join(reversed(stack)))
+    for index, closers in reversed(boundaries[-8:]):
+        candidates.append(text[:index] + closers)
+    return candidates
+
+
+def json_candidates(text: str) -> Iterator[Tuple[Any, bool]]:
+    """
+    Parse JSON out of an LLM reply, yielding (data, salvaged) for each reading
+    that parses, best first: the reply as-is, then valid JSON followed by
+    trailing text, then truncation repairs from the longest down.
+    Handles code fences, leading prose, trailing garbage and truncated output.
+    Raises LLMParseError if no reading parses.
+    """
+    cleaned = strip_json_fences(text)
+    try:
+        data = _loads(cleaned)
+    except ValueError:
+        pass
+    else:
+        yield data, False
+        return
+
+    starts = [i for i in (cleaned.find("{"), cleaned.find("[")) if i >= 0]
+    if not starts:
+        raise LLMParseError("no JSON object or array in response")
+    body = cleaned[min(starts):]
+
+    found = False
+    # Valid JSON followed by trailing text
+    try:
+        data = json.JSONDecoder().raw_decode(body)[0]
+    except ValueError:
+        pass
+    else:
+        found = True
+        yield data, True
+
+    for candidate in _close_truncated(body):
+        try:
+            data = _loads(candidate)
+        except ValueError:
+            continue
+        found = True
+        yield data, True
+    if not found:
+        raise LLMParseError("response is not valid JSON")
+
+
+def extract_json(text: str) -> Tuple[Any, bool]:
+    """The first reading of json_candidates(), as (data, salvaged)."""
+    return next(json_candidates(text))
+
+
+def parse_llm_response(stage: str, text: str, schema: Any) -> Any:
+    """
+    Parse and validate an LLM reply against a Pydantic model (or a typing
+    construct such as List[Model]), counting parsed/salvaged/failed outcomes per stage.
+    A truncated reply is validated against each repair in turn, so a cut-off
+    list element that no longer validates is dropped rather than failing the reply.
+    """
+    adapter = _adapters.get(schema)
+    if adapter is None:
+        adapter = _adapters[schema] = TypeAdapter(schema)
+    with span("llm_parse", LLM_PARSE_DURATION, stage=stage):
+        error: Optional[Exception] = None
+        try:
+            for data, salvaged in json_candidates(text):
+                try:
+                    result = adapter.validate_python(data)
+                    break
+                except ValidationError as e:
+                    error = error or e
+            else:
+                raise error
+        except (LLMParseError, ValidationError) as e:
+            LLM_PARSE_RESULTS.labels(stage=stage, outcome="failed").inc()
+            raise LLMParseError(f"{stage}: {e}") from e
+
+    LLM_PARSE_RESULTS.labels(stage=stage, outcome="salvaged" if salvaged else "parsed").inc()
+    return result
+
+
+async def generate_structured(client, stage: str, prompt: str, schema: Any,
+                              images: Optional[List[Any]] = None, image_keys: Optional[List[str]] = None) -> Any:
+    """
+    Request JSON output from the LLM and validate it into `schema`.
+    Unusable replies are evicted from the client's memo so they are not replayed.
+    """
+    text = await client.generate(prompt, images=images, json_mode=True, stage=stage, image_keys=image_keys)
+    try:
+        return parse_llm_response(stage, text, schema)
+    except LLMParseError:
+        await client.forget(prompt, images=images, json_mode=True, image_keys=image_keys)
+        raise
@@ -0,0 +1,187 @@
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from caption_prep import EMOJI_RE, HASHTAG_RE
+
+TOKEN_RE = re.compile(r"#\w+|[a-z][a-z']+|" + EMOJI_RE.pattern)
+NEGATORS = {"not", "no", "never", "dont", "don't", "cant", "can't", "isnt", "isn't", "wasnt", "wasn't", "aint", "ain't"}
+
+POSITIVE_WORDS = {
+    "love", "loved", "loving", "lovely", "happy", "happiness", "joy", "fun", "great", "good", "best", "amazing",
+    "awesome", "beautiful", "gorgeous", "cute", "perfect", "blessed", "grateful", "thankful", "excited", "exciting",
+    "proud", "win", "winning", "yay", "wonderful", "fantastic", "incredible", "favorite", "favourite", "enjoy",
+    "enjoyed", "vibes", "glow", "chill", "relaxing", "peaceful", "sunshine", "smile", "smiling", "laugh", "lol",
+    "adorable", "delicious", "yummy", "cozy", "dream", "dreamy", "magic", "magical", "thrilled", "stoked", "bliss",
+}
+NEGATIVE_WORDS = {
+    "sad", "hate", "hated", "angry", "mad", "bad", "worst", "awful", "terrible", "tired", "exhausted", "stressed",
+    "stress", "cry", "crying", "lonely", "alone", "hurt", "pain", "sick", "broken", "fail", "failed", "lost",
+    "miss", "missing", "ugh", "annoyed", "annoying", "bored", "boring", "depressed", "anxious", "anxiety", "sorry",
+    "rip", "upset", "disappointed", "scared", "fear", "worried", "struggle", "struggling", "heartbroken", "gloomy",
+}
+EMOJI_SENTIMENT = {
+    "😀": 1, "😃": 1, "😄": 1, "😁": 1, "😊": 1, "🙂": 1, "😍": 1, "🥰": 1, "😘": 1, "😎": 1, "🤩": 1, "🥳": 1,
+    "😂": 1, "🤣": 1, "❤": 1, "💕": 1, "💖": 1, "💯": 1, "✨": 1, "🌟": 1, "⭐": 1, "🔥": 1, "🎉": 1, "🙌": 1,
+    "👏": 1, "💪": 1, "🌈": 1, "☀": 1, "🌸": 1, "👍": 1, "😇": 1, "🤗": 1,
+    "😢": -1, "😭": -1, "😞": -1, "😔": -1, "😩": -1, "😫": -1, "😠": -1, "😡": -1, "💔": -1, "😒": -1,
+    "🙄": -1, "😤": -1, "😰": -1, "😱": -1, "👎": -1, "🥀": -1, "😣": -1, "😖": -1,
+}
+
+# Hashtags and words that map a caption to a topic
+TOPIC_TERMS = {
+    "fitness": {"gym", "fitness", "workout", "training", "gains", "run", "running", "yoga", "lifting", "fitfam", "💪"},
+    "food": {"food", "foodie", "dinner", "lunch", "breakfast", "brunch", "cooking", "recipe", "pizza", "delicious",
+             "yummy", "baking", "dessert", "instafood", "🍕", "🍔", "🍰"},
+    "coffee": {"coffee", "latte", "espresso", "cafe", "cappuccino", "coffeetime", "☕"},
+    "travel": {"travel", "trip", "vacation", "holiday", "wanderlust", "explore", "beach", "adventure", "roadtrip",
+               "travelgram", "flight", "✈", "🌍", "🏖"},
+    "study": {"study", "studying", "studygram", "exam", "exams", "school", "college", "university", "class",
+              "homework", "library", "books", "reading", "📚"},
+    "fashion": {"fashion", "outfit", "ootd", "style", "styled", "wearing", "dress", "shoes", "streetstyle"},
+    "beauty": {"makeup", "skincare", "beauty", "nails", "hair", "glam", "💄"},
+    "music": {"music", "song", "songs", "concert", "guitar", "playlist", "singing", "festival", "🎵", "🎶", "🎸"},
+    "art": {"art", "artist", "drawing", "painting", "sketch", "design", "creative", "photography", "photo", "🎨"},
+    "nature": {"nature", "sunset", "sunrise", "mountains", "hiking", "forest", "ocean", "flowers", "sky", "🌅", "🌲"},
+    "pets": {"dog", "dogs", "puppy", "cat", "cats", "kitten", "pet", "pets", "dogsofinstagram", "🐶", "🐱"},
+    "friends & family": {"friends", "friend", "bestie", "besties", "family", "mom", "dad", "sister", "brother", "squad"},
+    "tech": {"tech", "coding", "code", "developer", "programming", "startup", "ai", "gaming", "gamer", "💻", "🎮"},
+    "lifestyle": {"lifestyle", "vibes", "mood", "moods", "weekend", "selfcare", "blessed", "goodvibes", "dailylife"},
+    "sports": {"football", "soccer", "basketball", "tennis", "game", "match", "team", "sports", "⚽", "🏀"},
+}
+TERM_TOPICS = {term: topic for topic, terms in TOPIC_TERMS.items() for term in terms}
+
+STOPWORDS = {
+    "the", "and", "for", "you", "your", "with", "this", "that", "are", "was", "but", "all", "its", "it's", "our",
+    "just", "have", "has", "had", "from", "out", "what", "when", "who", "how", "can", "will", "too", "get", "got",
+    "into", "about", "they", "them", "she", "her", "his", "him", "we're", "i'm", "you're", "been", "more", "some",
+    "than", "then", "there", "here", "also", "one", "day", "today", "like", "not", "dont", "don't", "these", "those",
+    "very", "much", "again", "still", "even", "really",
+}
+
+
+@dataclass
+class LocalAnalysis:
+    analysis: Dict[str, Any]
+    confidence: float
+
+
+class LocalTextAnalyzer:
+    """
+    Tier-0 caption analysis without an LLM call, in the same shape as the
+    Gemini caption analysis.
+
+    Sentiment comes from a word/emoji lexicon (with simple negation), topics
+    from hashtags and words mapped to a fixed topic list, keywords from TF-IDF
+    over the profile's captions, and style from caption length, emoji and
+    hashtag density. Term scoring is vectorized over all captions at once.
+
+    confidence (0-1) is low when few captions carry sentiment or topic signal,
+    or when captions disagree; callers skip Gemini above `confidence_threshold`.
+    """
+
+    def __init__(self, confidence_threshold: float = 0.7, max_topics: int = 3, max_keywords: int = 5):
+        self.confidence_threshold = confidence_threshold
+        self.max_topics = max_topics
+        self.max_keywords = max_keywords
+
+    @classmethod
+    def from_env(cls) -> "LocalTextAnalyzer":
+        # A threshold above 1 sends every caption set to Gemini
+        return cls(confidence_threshold=float(os.getenv("LOCAL_ANALYSIS_CONFIDENCE", "0.7")))
+
+    def _tokenize(self, captions: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+        """(doc index, term index, polarity) per token occurrence, plus the vocabulary."""
+        vocabulary: Dict[str, int] = {}
+        docs, terms, polarity = [], [], []
+        for doc, caption in enumerate(captions):
+            negate = 0
+            for token in TOKEN_RE.findall(caption.lower()):
+                token = token.rstrip("\uFE0F")
+                term = token.lstrip("#")
+                if term in NEGATORS:
+                    negate = 2
+                    continue
+                score = EMOJI_SENTIMENT.get(term, 1 if term in POSITIVE_WORDS else -1 if term in NEGATIVE_WORDS else 0)
+                if negate:
+                    score, negate = -score, negate - 1
+                docs.append(doc)
+                terms.append(vocabulary.setdefault(term, len(vocabulary)))
+                polarity.append(score)
+        return (np.array(docs, dtype=np.int64), np.array(terms, dtype=np.int64),
+                np.array(polarity, dtype=np.float32), list(vocabulary))
+
+    def _style(self, captions: List[str]) -> str:
+        words = np.array([len(c.split()) for c in captions], dtype=np.float32)
+        emojis = np.array([len(EMOJI_RE.findall(c)) for c in captions], dtype=np.float32)
+        hashtags = np.array([len(HASHTAG_RE.findall(c)) for c in captions], dtype=np.float32)
+        exclaims = np.array(["!" in c for c in captions], dtype=np.float32)
+
+        traits = []
+        if words.mean() >= 25:
+            traits.append("long-form storytelling")
+        elif words.mean() <= 6:
+            traits.append("short and punchy")
+        if emojis.mean() >= 1:
+            traits.append("emoji-heavy")
+        if hashtags.mean() >= 3:
+            traits.append("hashtag-driven")
+        if exclaims.mean() >= 0.5:
+            traits.append("enthusiastic")
+        return ", ".join(traits[:2]) if traits else "casual and conversational"
+
+    def analyze(self, captions: List[str]) -> LocalAnalysis:
+        captions = [c for c in captions if c and c.strip()]
+        if not captions:
+            return LocalAnalysis({"dominant_sentiment": "neutral", "topics": [], "style": "minimal", "keywords": []}, 1.0)
+
+        n_docs = len(captions)
+        docs, terms, polarity, vocabulary = self._tokenize(captions)
+        n_terms = len(vocabulary)
+        if n_terms == 0:
+            return LocalAnalysis({"dominant_sentiment": "neutral", "topics": [], "style": self._style(captions),
+                                  "keywords": []}, 0.0)
+
+        # Sentiment: per-caption lexicon score, then a vote across captions
+        doc_scores = np.bincount(docs, weights=polarity, minlength=n_docs)
+        positive, negative = int((doc_scores > 0).sum()), int((doc_scores < 0).sum())
+        signaled = positive + negative
+        if signaled == 0:
+            sentiment, sentiment_confidence = "neutral", 0.0
+        else:
+            sentiment = "positive" if positive >= negative else "negative"
+            agreement = max(positive, negative) / signaled
+            coverage = signaled / n_docs
+            sentiment_confidence = agreement * (0.5 + 0.5 * coverage)
+            if agreement < 0.6:
+                sentiment = "neutral"
+
+        # TF-IDF: term frequency over the profile, inverse frequency across its captions
+        tf = np.bincount(terms, minlength=n_terms).astype(np.float32)
+        doc_terms = np.unique(docs * n_terms + terms)
+        df = np.bincount(doc_terms % n_terms, minlength=n_terms).astype(np.float32)
+        tfidf = tf * (np.log((1 + n_docs) / (1 + df)) + 1)
+        eligible = np.array([len(t) >= 3 and t not in STOPWORDS and t.isalpha() for t in vocabulary], dtype=bool)
+        ranked = np.argsort(-np.where(eligible, tfidf, -np.inf), kind="stable")
+        keywords = [vocabulary[i] for i in ranked[:self.max_keywords] if eligible[i]]
+
+        # Topics: captions mentioning each topic's terms
+        topic_of = np.array([TERM_TOPICS.get(t, "") for t in vocabulary], dtype=object)
+        mapped = topic_of[terms] != ""
+        topic_docs = Counter()
+        for doc, topic in set(zip(docs[mapped].tolist(), topic_of[terms[mapped]].tolist())):
+            topic_docs[topic] += 1
+        topics = [topic for topic, _ in topic_docs.most_common(self.max_topics)]
+        topic_confidence = len(set(docs[mapped].tolist())) / n_docs
+
+        analysis = {
+            "dominant_sentiment": sentiment,
+            "topics": topics,
+            "style": self._style(captions),
+            "keywords": keywords,
+        }
+        return LocalAnalysis(analysis, round(min(sentiment_confidence, topic_confidence), 3))
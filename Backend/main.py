@@ -1,35 +1,95 @@
 # main.py - Production-ready version with Instagram API integration
 import os
 import json
-import requests
 import asyncio
-from typing import List, Optional, Dict, Any
-from fastapi import FastAPI, HTTPException
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Any, AsyncIterator, Callable, Literal, Tuple
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse, Response
+from starlette.background import BackgroundTask
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-import google.generativeai as genai
 import re
-from io import BytesIO
-from PIL import Image
 from instagram_api import get_instagram_profile_data, InstagramBusinessAPI
+from llm_client import create_llm_client, llm_backend_is_fake
+from cache import create_demo_cache, create_vibe_cache
+from singleflight import SingleFlight
+from image_pipeline import ImageFetcher
+from metrics import request_id_var, span, record_fallback, STAGE_DURATION, INFLIGHT_REQUESTS, LOCAL_ANALYSIS
+from llm_parsing import (
+    generate_structured, TextAnalysis, VibeProfileText, MemeText,
+    ImageDescription, FusedGeneration, FullyFusedGeneration
+)
+from palette import PaletteExtractor
+from batching import MicroBatcher
+from admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from ratelimit import RateLimited
+from circuit import CircuitOpen
+from jobs import JobWorkerPool, JobQueueFull, CallbackRejected, public_job
+from profile_state import ProfileStateStore, post_window
+from caption_prep import CaptionPreprocessor
+from local_analysis import LocalTextAnalyzer
 
 # Load env
 load_dotenv()
 
-# Initialize Gemini client
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-gemini_model = genai.GenerativeModel('models/gemini-2.0-flash')
+STARTED_AT = time.monotonic()
+
+# Initialize async Gemini client (LLM_BACKEND=fake for local load tests)
+llm_client = create_llm_client()
+
+
+# Image downloads for vision analysis
+image_fetcher = ImageFetcher.from_env()
+palette_extractor = PaletteExtractor.from_env()
+VISION_MAX_IMAGES = int(os.getenv("VISION_MAX_IMAGES", "5"))
+
+# Dedupes, compacts and samples captions so caption prompts stay within CAPTION_TOKEN_BUDGET
+caption_preprocessor = CaptionPreprocessor.from_env()
+# Tier-0 caption analysis: answers without Gemini above LOCAL_ANALYSIS_CONFIDENCE, and backs Gemini failures
+local_analyzer = LocalTextAnalyzer.from_env()
 
-# Initialize Instagram Business API
-business_api = InstagramBusinessAPI()
-if business_api.page_access_token and business_api.business_account_id:
-    print("✅ Instagram Business API configured with Page Access Token")
-else:
-    print("⚠️  Instagram Business API needs Page Access Token configuration")
-    print("   See INSTAGRAM_BUSINESS_API_SETUP.md for setup instructions")
+# Response cache for whole vibecheck results, keyed by (username, max_posts)
+vibe_cache = create_vibe_cache()
+# Demo-data responses are kept for VIBE_CACHE_DEMO_TTL only, so real data shows up soon after setup
+demo_cache = create_demo_cache()
+_revalidating = set()
+_background_tasks = set()
 
+# Per-profile post windows and caption analyses, so a refresh only analyzes new posts
+VIBECHECK_INCREMENTAL = os.getenv("VIBECHECK_INCREMENTAL", "true").lower() == "true"
+profile_states = ProfileStateStore.from_env()
 
+# Collapse concurrent duplicate work: whole pipelines and profile scrapes
+pipeline_flights = SingleFlight("pipeline")
+scrape_flights = SingleFlight("scrape")
+
+# Per-stage timeouts (seconds) for the /vibecheck/ pipeline
+SCRAPE_STAGE_TIMEOUT = float(os.getenv("VIBECHECK_SCRAPE_TIMEOUT", "20"))
+ANALYSIS_STAGE_TIMEOUT = float(os.getenv("VIBECHECK_ANALYSIS_TIMEOUT", "30"))
+GENERATION_STAGE_TIMEOUT = float(os.getenv("VIBECHECK_GENERATION_TIMEOUT", "30"))
+
+# Admission control for /vibecheck/ work: bounded concurrency, bounded wait queue with a
+# deadline, 503 + Retry-After beyond that (cache hits bypass it)
+vibecheck_admission = AdmissionController.from_env("vibecheck", "VIBECHECK", max_concurrent=32,
+                                                   max_queue=64, queue_timeout=10.0)
+
+# /vibecheck/batch limits: links per request and profiles processed concurrently
+VIBECHECK_BATCH_MAX_LINKS = int(os.getenv("VIBECHECK_BATCH_MAX_LINKS", "500"))
+VIBECHECK_BATCH_CONCURRENCY = int(os.getenv("VIBECHECK_BATCH_CONCURRENCY", "8"))
+
+# LLM call layout: "standard" (captions, profile, memes), "fused" (captions, profile+memes)
+# or "fully_fused" (one call for all three)
+PIPELINE_MODES = ("standard", "fused", "fully_fused")
+PIPELINE_MODE = os.getenv("VIBECHECK_PIPELINE_MODE", "standard").strip().lower()
+if PIPELINE_MODE not in PIPELINE_MODES:
+    # A typo would otherwise silently run the standard layout
+    raise ValueError(f"VIBECHECK_PIPELINE_MODE must be one of {', '.join(PIPELINE_MODES)}, got {PIPELINE_MODE!r}")
 
 # App init
 app = FastAPI(title="Vibe Check AI Backend")
@@ -47,13 +107,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Retry-After"],
 )
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag every request (and the spans it records) with an X-Request-ID."""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    INFLIGHT_REQUESTS.inc()
+    try:
+        response = await call_next(request)
+    finally:
+        INFLIGHT_REQUESTS.dec()
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Pydantic request model
 class VibeRequest(BaseModel):
     insta_link: Optional[str] = None
     max_posts: int = 12
 
+class VibeBatchRequest(BaseModel):
+    insta_links: List[str]
+    max_posts: int = 12
+
+class VibeJobRequest(BaseModel):
+    insta_link: Optional[str] = None
+    max_posts: int = 12
+    priority: Literal["high", "normal", "low"] = "normal"
+    callback_url: Optional[str] = None
+
 def extract_username(insta_link: str) -> str:
     """Extract username from Instagram profile URL or return raw username.
     Handles various Instagram URL formats safely.
@@ -106,20 +191,30 @@ def extract_username(insta_link: str) -> str:
     
     return ""
 
-async def scrape_instagram_profile(username: str, max_posts: int = 12) -> Dict[str, Any]:
+def get_business_api(request: Request) -> InstagramBusinessAPI:
+    """FastAPI dependency returning the process-wide Instagram client."""
+    return request.app.state.business_api
+
+async def scrape_instagram_profile(username: str, business_api: InstagramBusinessAPI, max_posts: int = 12,
+                                   on_page: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                                   since: Optional[str] = None) -> Dict[str, Any]:
     """
     Get Instagram profile data using the new Instagram API integration.
     Uses app credentials to provide enhanced demo data with realistic content.
     This replaces the old instaloader-based scraping.
+    on_page receives each page of real posts as soon as it is fetched;
+    since limits real posts to those newer than a stored watermark.
     """
     try:
         # Use the new Instagram API integration
-        return await get_instagram_profile_data(username=username, max_posts=max_posts)
+        return await get_instagram_profile_data(username=username, business_api=business_api,
+                                                max_posts=max_posts, on_page=on_page, since=since)
         
     except Exception as e:
         print(f"Instagram API failed for {username}: {e}")
+        record_fallback("scrape", reason=fallback_reason(e))
         # Return fallback data
-        return {
+        return FallbackScrape({
             "username": username,
             "bio": f"Profile analysis for @{username} (API fallback)",
             "posts": [
@@ -127,73 +222,355 @@ async def scrape_instagram_profile(username: str, max_posts: int = 12) -> Dict[s
                 {"caption": "Coffee thoughts and weekend moods ☕ #lifestyle", "url": None, "image_url": "https://upload.wikimedia.org/wikipedia/en/1/11/Disaster_Girl.jpg"},
                 {"caption": "Grateful for these moments 🌟 #blessed", "url": None, "image_url": "https://i.pinimg.com/564x/0d/eb/89/0deb89754dd50d64d468a41713ae8a82.jpg"}
             ]
-        }
+        })
 
-async def analyze_captions_with_llm(captions: List[str]) -> Dict[str, Any]:
-    """Analyze captions using Google Gemini for real sentiment and topic analysis."""
-    if not captions or not any(captions):
-        return {"dominant_sentiment": "neutral", "topics": [], "style": "minimal", "keywords": []}
-    
-    # Join all captions for analysis
-    text_to_analyze = " ".join([c for c in captions if c and c.strip()])
+def fallback_reason(error: Exception) -> str:
+    """Metrics label for why a stage fell back."""
+    if isinstance(error, AdmissionRejected):
+        return "overloaded"
+    if isinstance(error, RateLimited):
+        return "rate_limited"
+    if isinstance(error, CircuitOpen):
+        return "circuit_open"
+    return "error"
+
+class FallbackResult:
+    """Marks a stage result produced by a fallback path; responses containing one are not cached."""
+
+class FallbackTextAnalysis(FallbackResult, dict):
+    """A caption analysis produced by a fallback path, so it is never stored as if Gemini produced it."""
+
+class FallbackScrape(FallbackResult, dict):
+    """Placeholder profile data used when the Instagram API fails."""
+
+class FallbackVibeProfile(FallbackResult, dict):
+    """Generic vibe profile used when Gemini fails or times out."""
+
+class FallbackList(FallbackResult, list):
+    """Fallback memes, or image analyses without Gemini descriptions."""
+
+def is_degraded(response: Dict[str, Any]) -> bool:
+    """
+    True if any stage of a vibecheck response fell back, the scrape served demo
+    data, or some posts could not be fetched.
+    """
+    scrape = response.get("scrape", {})
+    return (scrape.get("source") == "enhanced_demo" or scrape.get("complete") is False
+            or any(isinstance(result, FallbackResult) for result in response.values()))
+
+def is_demo_response(response: Dict[str, Any]) -> bool:
+    """True if a response is degraded only because the scrape served demo data."""
+    scrape = response.get("scrape", {})
+    return (scrape.get("source") == "enhanced_demo" and scrape.get("complete") is not False
+            and not any(isinstance(result, FallbackResult) for result in response.values()))
+
+def default_text_analysis(captions: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Fallback caption analysis used when Gemini fails or times out:
+    the local analyzer's best guess from the captions, or a generic profile without them.
+    """
+    if captions and any(captions):
+        return FallbackTextAnalysis(local_analyzer.analyze(captions).analysis)
+    return FallbackTextAnalysis({
+        "dominant_sentiment": "positive",
+        "topics": ["lifestyle", "personal"],
+        "style": "authentic and relatable",
+        "keywords": ["life", "vibes", "moments"]
+    })
+
+def default_vibe_profile(username: str) -> Dict[str, Any]:
+    """Fallback vibe profile used when Gemini fails or times out."""
+    return FallbackVibeProfile({
+        "profile_text": f"@{username} is serving authentic vibes with that perfect balance of chaos and charm. The main character energy is strong with this one! ✨",
+        "tagline": "Living life in full color 🌈",
+        "username": username,
+        "dominant_sentiment": "positive",
+        "topics": ["lifestyle"],
+        "style": "main character"
+    })
+
+def default_memes(text_analysis: Dict[str, Any], instagram_posts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Fallback memes built from the available Instagram images."""
+    topics = text_analysis.get('topics', ['lifestyle'])
+    style = text_analysis.get('style', 'authentic')
+    sentiment = text_analysis.get('dominant_sentiment', 'positive')
+    available_images = [post for post in instagram_posts[:2] if post.get('image_url')]
     
-    try:
-        prompt = f"""Analyze the following social media captions and return ONLY a valid JSON object with no additional text:
+    memes = []
+    for i, post in enumerate(available_images[:2]):
+        fallback_caption = f"Vibe Check Result: {sentiment.title()}" if i == 0 else f"Mood: {topics[0] if topics else 'Aesthetic'}"
+        fallback_text = f"POV: You're living your {sentiment} {topics[0] if topics else 'boss'} era ✨" if i == 0 else f"When someone asks about your {style} energy 💫"
+        
+        memes.append({
+            "caption": fallback_caption,
+            "meme_text": fallback_text,
+            "image_url": post.get('image_url'),
+            "original_caption": post.get('caption', ''),
+            "url": post.get('url')
+        })
+    return FallbackList(memes)
 
-{{
+CAPTION_ANALYSIS_SCHEMA = """{
   "dominant_sentiment": "positive", "negative", or "neutral",
   "topics": ["topic1", "topic2", "topic3"],
   "style": "description of writing style",
   "keywords": ["keyword1", "keyword2", "keyword3"]
-}}
+}"""
+
+def caption_text(captions: List[str]) -> str:
+    """The text sent for caption analysis: deduplicated, trimmed captions within the token budget."""
+    return caption_preprocessor.prepare(captions).text
+
+def caption_analysis_prompt(text_to_analyze: str) -> str:
+    return f"""Analyze the following social media captions and return ONLY a valid JSON object with no additional text:
+
+{CAPTION_ANALYSIS_SCHEMA}
 
 Captions to analyze: {text_to_analyze}
 
 Return only the JSON object:"""
-        
-        response = gemini_model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean the response to extract JSON
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].strip()
-            
-        result = json.loads(response_text)
-        return result
+
+def local_text_analysis(captions: List[str]) -> Optional[Dict[str, Any]]:
+    """The local analysis if it is confident enough to skip Gemini, else None."""
+    result = local_analyzer.analyze(captions)
+    if result.confidence >= local_analyzer.confidence_threshold:
+        LOCAL_ANALYSIS.labels(outcome="confident").inc()
+        return result.analysis
+    LOCAL_ANALYSIS.labels(outcome="deferred").inc()
+    return None
+
+async def analyze_captions_with_gemini(captions: List[str]) -> Dict[str, Any]:
+    """Caption analysis by Gemini, falling back to the local analysis if the call fails."""
+    try:
+        prompt = caption_analysis_prompt(caption_text(captions))
+        result = await generate_structured(llm_client, "text_analysis", prompt, TextAnalysis)
+        return result.model_dump()
         
     except Exception as e:
         print(f"Gemini caption analysis failed: {e}")
-        # Fallback analysis
-        return {
-            "dominant_sentiment": "positive",
-            "topics": ["lifestyle", "personal"],
-            "style": "authentic and relatable",
-            "keywords": ["life", "vibes", "moments"]
-        }
+        record_fallback("text_analysis", reason=fallback_reason(e))
+        return default_text_analysis(captions)
+
+async def analyze_captions_with_llm(captions: List[str]) -> Dict[str, Any]:
+    """
+    Analyze captions for sentiment, topics, style and keywords.
+    Simple caption sets the local analyzer is confident about skip the Gemini call.
+    """
+    if not captions or not any(captions):
+        return {"dominant_sentiment": "neutral", "topics": [], "style": "minimal", "keywords": []}
+    
+    local = local_text_analysis(captions)
+    if local is not None:
+        return local
+    return await analyze_captions_with_gemini(captions)
+
+async def analyze_caption_batch(caption_sets: List[List[str]]) -> List[Dict[str, Any]]:
+    """
+    Analyze several profiles' captions in one Gemini request.
+    A batch of one is a regular single-profile analysis (sharing its memo entries),
+    which already falls back on failure, so only packed batches can raise.
+    """
+    if len(caption_sets) == 1:
+        return [await analyze_captions_with_gemini(caption_sets[0])]
+    
+    texts = [caption_text(captions) for captions in caption_sets]
+    profiles = "\n\n".join(f"Profile {i + 1} captions: {text}" for i, text in enumerate(texts))
+    prompt = f"""Analyze the social media captions of each of the following {len(texts)} profiles independently.
+Return ONLY a valid JSON array with exactly {len(texts)} objects, one per profile in the same order, each shaped like:
+
+{CAPTION_ANALYSIS_SCHEMA}
+
+{profiles}
+
+Return only the JSON array:"""
+    results = await generate_structured(llm_client, "text_analysis_batch", prompt, List[TextAnalysis])
+    return [result.model_dump() for result in results]
+
+# Packs caption analyses from concurrent /vibecheck/batch pipelines into shared Gemini requests
+caption_batcher = MicroBatcher(
+    "caption_analysis", analyze_caption_batch,
+    max_batch=int(os.getenv("VIBECHECK_BATCH_PACK_SIZE", "5")),
+    max_delay=float(os.getenv("VIBECHECK_BATCH_PACK_DELAY", "0.05"))
+)
+
+async def analyze_captions_batched(captions: List[str]) -> Dict[str, Any]:
+    """analyze_captions_with_llm via the caption batcher; retries alone if a packed request fails."""
+    if not captions or not any(captions):
+        return {"dominant_sentiment": "neutral", "topics": [], "style": "minimal", "keywords": []}
+    
+    local = local_text_analysis(captions)
+    if local is not None:
+        return local
+    try:
+        return await caption_batcher.submit(captions)
+    except Exception as e:
+        print(f"Packed caption analysis failed, analyzing alone: {e}")
+        return await analyze_captions_with_gemini(captions)
+
+def merge_text_analyses(results: List[Dict[str, Any]], weights: Optional[List[int]] = None) -> Dict[str, Any]:
+    """
+    Combine per-page caption analyses: majority sentiment and style, most frequent topics and keywords.
+    weights (e.g. posts covered by each analysis) scale each result's votes; ties go to earlier results.
+    """
+    if len(results) == 1:
+        return results[0]
+    if weights is None:
+        weights = [1] * len(results)
+    # A merge that includes a fallback analysis is itself a fallback
+    merged_type = FallbackTextAnalysis if any(isinstance(r, FallbackTextAnalysis) for r in results) else dict
+    
+    def votes(values) -> Counter:
+        counts = Counter()
+        for value, weight in zip(values, weights):
+            for item in (value if isinstance(value, list) else [value]):
+                counts[item] += weight
+        return counts
+    
+    def most_common(field: str, limit: int) -> List[str]:
+        return [item for item, _ in votes(r.get(field, []) for r in results).most_common(limit)]
+    
+    return merged_type({
+        "dominant_sentiment": votes(r.get("dominant_sentiment", "neutral") for r in results).most_common(1)[0][0],
+        "topics": most_common("topics", 5),
+        "style": votes(r.get("style", "authentic") for r in results).most_common(1)[0][0],
+        "keywords": most_common("keywords", 5)
+    })
+
+async def combine_caption_analyses(page_analyses: List["asyncio.Task"]) -> Dict[str, Any]:
+    """Wait for the caption analyses started per media page and merge them."""
+    return merge_text_analyses(await asyncio.gather(*page_analyses))
+
+async def incremental_caption_analysis(username: str, max_posts: int, state: Optional[Dict[str, Any]],
+                                       new_posts: List[Dict[str, Any]], page_posts: List[List[Dict[str, Any]]],
+                                       page_analyses: List["asyncio.Task"],
+                                       caption_analyzer: Callable, save: bool = True) -> Dict[str, Any]:
+    """
+    Caption analysis that only covers new_posts (every post on a first run) and
+    merges it into the stored per-profile analyses, weighted by posts covered.
+    page_analyses, when set, are the analyses already started for page_posts.
+    The updated state is saved only when `save` is set (the fetch completed)
+    and no analysis fell back to the default.
+    """
+    if page_analyses:
+        chunks = list(zip(page_posts, await asyncio.gather(*page_analyses)))
+    elif new_posts:
+        chunks = [(new_posts, await caption_analyzer([p.get("caption", "") for p in new_posts]))]
+    else:
+        chunks = []
+    
+    updated = profile_states.apply(state, new_posts, chunks, max_posts)
+    if save and not any(isinstance(analysis, FallbackTextAnalysis) for _, analysis in chunks):
+        await profile_states.save(username, max_posts, updated)
+    
+    analyses, weights = profile_states.weighted_analyses(updated)
+    if not analyses:
+        return {"dominant_sentiment": "neutral", "topics": [], "style": "minimal", "keywords": []}
+    return merge_text_analyses(analyses, weights)
+
+async def with_current_media_urls(posts: List[Dict[str, Any]],
+                                  business_api: InstagramBusinessAPI) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Fill in image URLs for posts taken from the profile store, which doesn't keep
+    them (they expire). Returns (posts, ok); ok is False if they couldn't be re-read.
+    """
+    missing = [post["id"] for post in posts if not post.get("image_url") and post.get("id")]
+    if not missing:
+        return posts, True
+    try:
+        urls = await business_api.get_media_urls(missing)
+    except Exception as e:
+        print(f"Re-reading media URLs failed: {e}")
+        record_fallback("scrape", reason=fallback_reason(e))
+        return posts, False
+    return [{**post, "image_url": urls[post["id"]]} if post.get("id") in urls else post for post in posts], True
 
 async def analyze_images_with_vision(image_urls: List[str]) -> List[Dict[str, Any]]:
-    """Analyze images using Google Gemini Vision model."""
+    """
+    Analyze post images: download and downscale them concurrently, extract
+    dominant colors locally, then describe all thumbnails with Gemini in a
+    single batched multimodal request.
+    """
     if not image_urls:
         return []
     
-    image_analyses = []
+    urls = [url for url in image_urls if url][:VISION_MAX_IMAGES]  # Limit images to manage API costs
+    thumbnails = await image_fetcher.fetch_thumbnails(urls)
+    if not thumbnails:
+        return []
     
-    for url in image_urls[:5]:  # Limit to 5 images to manage API costs
-        if not url:
-            continue
-            
-        # Temporarily return fallback analysis until we fix the model issue
-        print(f"Skipping image analysis for {url} - using fallback data")
+    # Colors are computed locally in one vectorized pass, off the event loop
+    palettes = await asyncio.to_thread(
+        palette_extractor.extract_batch,
+        [thumb.image for thumb in thumbnails],
+        [thumb.content_hash for thumb in thumbnails]
+    )
+    
+    descriptions = [{} for _ in thumbnails]
+    described_ok = False
+    try:
+        prompt = f"""You are given {len(thumbnails)} social media images in order. Return ONLY a valid JSON array with exactly one object per image, in the same order:
+
+[
+  {{
+    "mood": "short mood description, e.g. cozy / aesthetic",
+    "objects": ["object1", "object2"],
+    "description": "one sentence description of the image"
+  }}
+]
+
+Return only the JSON array:"""
+        
+        result = await generate_structured(llm_client, "image_analysis", prompt, List[ImageDescription],
+                                           images=[thumb.image for thumb in thumbnails],
+                                           image_keys=[thumb.content_hash for thumb in thumbnails])
+        described = [item.model_dump(exclude_none=True) for item in result]
+        descriptions = (described + descriptions)[:len(thumbnails)]
+        described_ok = True
+        
+    except Exception as e:
+        print(f"Gemini image analysis failed: {e}")
+        record_fallback("image_analysis", reason=fallback_reason(e))
+    
+    image_analyses = []
+    for thumb, colors, described in zip(thumbnails, palettes, descriptions):
         image_analyses.append({
-            "mood": "vibrant / aesthetic",
-            "colors": ["#4a5568", "#2d3748", "#1a202c"],
-            "objects": ["visual_content"],
-            "description": "Beautiful visual content with good aesthetic appeal"
+            "mood": described.get("mood", "vibrant / aesthetic"),
+            "colors": colors,
+            "objects": described.get("objects", ["visual_content"]),
+            "description": described.get("description", "Beautiful visual content with good aesthetic appeal"),
+            "image_url": thumb.url
         })
     
-    return image_analyses
+    return image_analyses if described_ok else FallbackList(image_analyses)
+
+def format_vibe_profile(result: Dict[str, Any], text_analysis: Dict[str, Any], username: str) -> Dict[str, Any]:
+    """Shape a Gemini summary/tagline reply into the vibe_profile response field."""
+    return {
+        "profile_text": result.get("summary", f"@{username} is serving authentic vibes with that perfect balance of chaos and charm! ✨"),
+        "tagline": result.get("tagline", "Living life in full color 🌈"),
+        "username": username,
+        "dominant_sentiment": text_analysis.get('dominant_sentiment', 'positive'),
+        "topics": text_analysis.get('topics', []),
+        "style": text_analysis.get('style', 'authentic')
+    }
+
+def format_memes(meme_data: List[Dict[str, Any]], text_analysis: Dict[str, Any],
+                 instagram_posts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Pair Gemini meme texts with the most recent Instagram images."""
+    topics = text_analysis.get('topics', ['lifestyle'])
+    sentiment = text_analysis.get('dominant_sentiment', 'positive')
+    available_images = [post for post in instagram_posts[:2] if post.get('image_url')]
+    
+    memes = []
+    for i, (meme, post) in enumerate(zip(meme_data[:len(available_images)], available_images)):
+        memes.append({
+            "caption": meme.get("caption", f"Meme {i+1}: {topics[i] if i < len(topics) else 'vibes'}"),
+            "meme_text": meme.get("meme_text", f"When your {sentiment} {topics[i] if i < len(topics) else 'lifestyle'} energy hits different"),
+            "image_url": post.get('image_url'),  # Use actual Instagram image
+            "original_caption": post.get('caption', ''),  # Keep original caption for context
+            "url": post.get('url')  # Instagram post URL
+        })
+    return memes
 
 async def create_vibe_profile(analysis_results: Dict[str, Any], user_bio: str, username: str) -> Dict[str, Any]:
     """Generate witty vibe profile using Google Gemini."""
@@ -214,36 +591,13 @@ Data:
 
 Make it funny but not mean. Return only the JSON:"""
         
-        response = gemini_model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean the response to extract JSON
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].strip()
-            
-        result = json.loads(response_text)
-        
-        return {
-            "profile_text": result.get("summary", f"@{username} is serving authentic vibes with that perfect balance of chaos and charm! ✨"),
-            "tagline": result.get("tagline", "Living life in full color 🌈"),
-            "username": username,
-            "dominant_sentiment": text_analysis.get('dominant_sentiment', 'positive'),
-            "topics": text_analysis.get('topics', []),
-            "style": text_analysis.get('style', 'authentic')
-        }
+        result = await generate_structured(llm_client, "vibe_profile", prompt, VibeProfileText)
+        return format_vibe_profile(result.model_dump(exclude_none=True), text_analysis, username)
         
     except Exception as e:
         print(f"Gemini vibe profile generation failed: {e}")
-        return {
-            "profile_text": f"@{username} is serving authentic vibes with that perfect balance of chaos and charm. The main character energy is strong with this one! ✨",
-            "tagline": "Living life in full color 🌈",
-            "username": username,
-            "dominant_sentiment": "positive",
-            "topics": ["lifestyle"],
-            "style": "main character"
-        }
+        record_fallback("vibe_profile", reason=fallback_reason(e))
+        return default_vibe_profile(username)
 
 async def generate_memes(analysis_results: Dict[str, Any], instagram_posts: List[Dict[str, Any]]) -> List[Dict[str, str]]:
     """Generate meme text content using Gemini based on actual Instagram images."""
@@ -254,8 +608,6 @@ async def generate_memes(analysis_results: Dict[str, Any], instagram_posts: List
     style = text_analysis.get('style', 'authentic')
     sentiment = text_analysis.get('dominant_sentiment', 'positive')
     
-    memes = []
-    
     # Use actual Instagram images for memes (limit to 2 most recent)
     available_images = [post for post in instagram_posts[:2] if post.get('image_url')]
     
@@ -281,93 +633,518 @@ User vibe:
 
 Make {len(available_images)} funny Gen Z memes. Return only the JSON array:"""
         
-        response = gemini_model.generate_content(prompt)
-        response_text = response.text.strip()
-        
-        # Clean the response to extract JSON
-        if "```json" in response_text:
-            response_text = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            response_text = response_text.split("```")[1].strip()
-            
-        meme_data = json.loads(response_text)
-        
-        for i, (meme, post) in enumerate(zip(meme_data[:len(available_images)], available_images)):
-            memes.append({
-                "caption": meme.get("caption", f"Meme {i+1}: {topics[i] if i < len(topics) else 'vibes'}"),
-                "meme_text": meme.get("meme_text", f"When your {sentiment} {topics[i] if i < len(topics) else 'lifestyle'} energy hits different"),
-                "image_url": post.get('image_url'),  # Use actual Instagram image
-                "original_caption": post.get('caption', ''),  # Keep original caption for context
-                "url": post.get('url')  # Instagram post URL
-            })
+        result = await generate_structured(llm_client, "memes", prompt, List[MemeText])
+        memes = format_memes([meme.model_dump(exclude_none=True) for meme in result], text_analysis, instagram_posts)
             
     except Exception as e:
         print(f"Gemini meme generation failed: {e}")
+        record_fallback("memes", reason=fallback_reason(e))
         # Fallback memes using available images
-        for i, post in enumerate(available_images[:2]):
-            fallback_caption = f"Vibe Check Result: {sentiment.title()}" if i == 0 else f"Mood: {topics[0] if topics else 'Aesthetic'}"
-            fallback_text = f"POV: You're living your {sentiment} {topics[0] if topics else 'boss'} era ✨" if i == 0 else f"When someone asks about your {style} energy 💫"
-            
-            memes.append({
-                "caption": fallback_caption,
-                "meme_text": fallback_text,
-                "image_url": post.get('image_url'),
-                "original_caption": post.get('caption', ''),
-                "url": post.get('url')
-            })
+        return default_memes(text_analysis, instagram_posts)
     
     return memes[:2]  # Ensure we return maximum 2 memes
 
+FUSED_OUTPUT_SCHEMA = """  "summary": "A witty, Gen Z style roast of the user's vibe",
+  "tagline": "A short catchy tagline",
+  "memes": [
+    {"caption": "Meme description", "meme_text": "Funny overlay text"}
+  ]"""
+
+async def generate_profile_and_memes(text_analysis: Dict[str, Any], user_bio: str, username: str,
+                                     instagram_posts: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
+    """Fused mode: vibe profile and memes from a single structured Gemini request."""
+    meme_count = len([post for post in instagram_posts[:2] if post.get('image_url')])
+    try:
+        prompt = f"""Create a fun vibe profile and meme captions based on this data. Return ONLY a valid JSON object:
+
+{{
+{FUSED_OUTPUT_SCHEMA}
+}}
+
+Data:
+- Sentiment: {text_analysis.get('dominant_sentiment', 'positive')}
+- Topics: {text_analysis.get('topics', [])}
+- Style: {text_analysis.get('style', 'authentic')}
+- Bio: {user_bio}
+
+Make it funny but not mean, with {meme_count} Gen Z memes. Return only the JSON:"""
+        
+        result = await generate_structured(llm_client, "profile_and_memes", prompt, FusedGeneration)
+        
+        memes = format_memes([meme.model_dump(exclude_none=True) for meme in result.memes], text_analysis, instagram_posts)
+        return format_vibe_profile(result.model_dump(), text_analysis, username), memes[:2]
+        
+    except Exception as e:
+        print(f"Gemini fused profile/meme generation failed: {e}")
+        record_fallback("profile_and_memes", reason=fallback_reason(e))
+        return default_vibe_profile(username), default_memes(text_analysis, instagram_posts)
+
+async def analyze_and_generate(captions: List[str], user_bio: str, username: str,
+                               instagram_posts: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, str]]]:
+    """
+    Fully fused mode: caption analysis, vibe profile and memes in one Gemini request.
+    When the local analyzer is confident, only the profile and memes go to Gemini.
+    """
+    if not captions or not any(captions):
+        text_analysis = await analyze_captions_with_llm(captions)
+    else:
+        text_analysis = local_text_analysis(captions)
+    if text_analysis is not None:
+        vibe_profile, memes = await generate_profile_and_memes(text_analysis, user_bio, username, instagram_posts)
+        return text_analysis, vibe_profile, memes
+    
+    text_to_analyze = caption_text(captions)
+    meme_count = len([post for post in instagram_posts[:2] if post.get('image_url')])
+    try:
+        prompt = f"""Analyze the following social media captions, then write a fun vibe profile and meme captions for their author. Return ONLY a valid JSON object:
+
+{{
+  "dominant_sentiment": "positive", "negative", or "neutral",
+  "topics": ["topic1", "topic2", "topic3"],
+  "style": "description of writing style",
+  "keywords": ["keyword1", "keyword2", "keyword3"],
+{FUSED_OUTPUT_SCHEMA}
+}}
+
+Captions to analyze: {text_to_analyze}
+Bio: {user_bio}
+
+Make it funny but not mean, with {meme_count} Gen Z memes. Return only the JSON:"""
+        
+        result = await generate_structured(llm_client, "fully_fused", prompt, FullyFusedGeneration)
+        
+        text_analysis = result.model_dump(include={"dominant_sentiment", "topics", "style", "keywords"})
+        memes = format_memes([meme.model_dump(exclude_none=True) for meme in result.memes], text_analysis, instagram_posts)
+        return text_analysis, format_vibe_profile(result.model_dump(), text_analysis, username), memes[:2]
+        
+    except Exception as e:
+        print(f"Gemini fully fused analysis failed: {e}")
+        record_fallback("fully_fused", reason=fallback_reason(e))
+        text_analysis = default_text_analysis(captions)
+        return text_analysis, default_vibe_profile(username), default_memes(text_analysis, instagram_posts)
+
+async def run_stage(name: str, coro, timeout: float, fallback: Any) -> Any:
+    """Await a pipeline stage with a timeout, returning the fallback if it runs over."""
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"Stage '{name}' timed out after {timeout}s - using fallback")
+        record_fallback(name, reason="timeout")
+        return fallback
+
+# Order in which pipeline stages appear in the final response
+PIPELINE_STAGES = ["scrape", "text_analysis", "image_analysis", "vibe_profile", "memes"]
+
+async def iter_vibecheck_events(username: str, max_posts: int, business_api: InstagramBusinessAPI,
+                                caption_analyzer: Callable = analyze_captions_with_llm) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run the scrape + analysis pipeline as a dependency graph, yielding
+    (stage, result) pairs in completion order.
+    Captions and images start together; profile and memes start as soon as
+    the caption analysis is ready, without waiting for the image analysis.
+    When the profile spans several media pages, caption analysis starts on
+    each page as it arrives while later pages are still being fetched.
+    PIPELINE_MODE controls how many Gemini calls the text stages use;
+    caption_analyzer lets /vibecheck/batch route caption analysis through the batcher.
+    With VIBECHECK_INCREMENTAL, a profile analyzed before only has its posts newer
+    than the stored watermark fetched and analyzed; the rest come from the store.
+    """
+    page_analyses: List[asyncio.Task] = []
+    page_posts: List[List[Dict[str, Any]]] = []
+    paged_posts = 0
+    accepting_pages = True
+    
+    def on_page(posts_page: List[Dict[str, Any]]):
+        nonlocal paged_posts
+        if not accepting_pages:
+            return
+        paged_posts += len(posts_page)
+        page_posts.append(posts_page)
+        page_analyses.append(asyncio.create_task(
+            caption_analyzer([p.get("caption", "") for p in posts_page])
+        ))
+    
+    # The fully fused call analyzes captions itself, so it can't reuse stored analyses
+    incremental = VIBECHECK_INCREMENTAL and PIPELINE_MODE != "fully_fused"
+    state = await profile_states.get(username, max_posts) if incremental else None
+    since = state["watermark"] if state else None
+    
+    try:
+        with span("scrape", STAGE_DURATION, stage="scrape"):
+            scrape_res = await asyncio.wait_for(
+                scrape_flights.do(
+                    vibe_cache_key(username, max_posts) + (f"@{since}" if since else ""),
+                    lambda: scrape_instagram_profile(
+                        username, max_posts=max_posts, business_api=business_api,
+                        on_page=None if PIPELINE_MODE == "fully_fused" else on_page,
+                        since=since
+                    )
+                ),
+                timeout=SCRAPE_STAGE_TIMEOUT
+            )
+    except BaseException:
+        for task in page_analyses:
+            task.cancel()
+        raise
+    finally:
+        accepting_pages = False
+    
+    if scrape_res.get("source") == "enhanced_demo":
+        record_fallback("scrape", reason="demo_data")
+    # A media page failed: the posts fetched are served, but the profile store keeps
+    # its old watermark so the missing ones are fetched next time
+    fetch_complete = scrape_res.get("complete", True)
+    if not fetch_complete:
+        record_fallback("scrape", reason="partial")
+    
+    # Only real Graph API data is folded into (or completed from) the profile store
+    incremental = incremental and scrape_res.get("source") == "instagram_business_api"
+    new_posts = scrape_res.get("posts", [])
+    if incremental and state:
+        window, urls_ok = await with_current_media_urls(post_window(new_posts, state["posts"], max_posts),
+                                                        business_api)
+        scrape_res = {**scrape_res, "posts": window, "new_posts": len(new_posts),
+                      "complete": fetch_complete and urls_ok}
+    
+    # Extract data for analysis
+    posts = scrape_res.get("posts", [])
+    captions = [p.get("caption", "") for p in posts]
+    image_urls = [p.get("image_url") for p in posts if p.get("image_url")]
+    user_bio = scrape_res.get("bio", "")
+    
+    # Page analyses are only usable if they covered exactly the posts fetched
+    # (not the case for demo fallbacks or when another request owned the shared scrape)
+    if page_analyses and paged_posts != len(new_posts if incremental else posts):
+        for task in page_analyses:
+            task.cancel()
+        page_analyses = []
+    
+    pending = set()
+    
+    def start_stage(stages: Tuple[str, ...], coro, timeout: float, fallback: Any):
+        # Each task resolves to {stage: result}; fused tasks complete several stages at once
+        async def run():
+            name = "+".join(stages)
+            with span(name, STAGE_DURATION, stage=name):
+                result = await run_stage(name, coro, timeout, fallback)
+            return dict(zip(stages, result)) if len(stages) > 1 else {stages[0]: result}
+        pending.add(asyncio.create_task(run()))
+    
+    # Stage 1: caption and image analysis are independent, run them together
+    start_stage(("image_analysis",), analyze_images_with_vision(image_urls), ANALYSIS_STAGE_TIMEOUT, FallbackList())
+    if PIPELINE_MODE == "fully_fused":
+        fallback_text = default_text_analysis(captions)
+        start_stage(("text_analysis", "vibe_profile", "memes"),
+                    analyze_and_generate(captions, user_bio, username, posts),
+                    ANALYSIS_STAGE_TIMEOUT + GENERATION_STAGE_TIMEOUT,
+                    (fallback_text, default_vibe_profile(username), default_memes(fallback_text, posts)))
+    elif incremental:
+        text_analysis = incremental_caption_analysis(username, max_posts, state, new_posts, page_posts,
+                                                     page_analyses, caption_analyzer, save=fetch_complete)
+        start_stage(("text_analysis",), text_analysis, ANALYSIS_STAGE_TIMEOUT, default_text_analysis(captions))
+    else:
+        text_analysis = combine_caption_analyses(page_analyses) if page_analyses else caption_analyzer(captions)
+        start_stage(("text_analysis",), text_analysis, ANALYSIS_STAGE_TIMEOUT, default_text_analysis(captions))
+    
+    try:
+        yield "scrape", scrape_res
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                for stage, result in task.result().items():
+                    yield stage, result
+                    
+                    if stage != "text_analysis" or PIPELINE_MODE == "fully_fused":
+                        continue
+                    # Stage 2: profile and memes only depend on the text analysis
+                    fallback = (default_vibe_profile(username), default_memes(result, posts))
+                    if PIPELINE_MODE == "fused":
+                        start_stage(("vibe_profile", "memes"),
+                                    generate_profile_and_memes(result, user_bio, username, posts),
+                                    GENERATION_STAGE_TIMEOUT, fallback)
+                    else:
+                        analysis_results = {"text_analysis": result}
+                        start_stage(("vibe_profile",), create_vibe_profile(analysis_results, user_bio, username),
+                                    GENERATION_STAGE_TIMEOUT, fallback[0])
+                        start_stage(("memes",), generate_memes(analysis_results, posts),
+                                    GENERATION_STAGE_TIMEOUT, fallback[1])
+    finally:
+        # Client went away mid-stream: don't leave orphaned LLM calls running
+        for task in [*pending, *page_analyses]:
+            task.cancel()
+
+def build_vibecheck_response(stages: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble the /vibecheck/ response body from completed stage results."""
+    return {
+        "ok": True,
+        **{stage: stages[stage] for stage in PIPELINE_STAGES},
+        "message": "Analysis complete using Instagram API and AI services!"
+    }
+
+async def run_vibecheck_pipeline(username: str, max_posts: int, business_api: InstagramBusinessAPI,
+                                 caption_analyzer: Callable = analyze_captions_with_llm) -> Dict[str, Any]:
+    """Run the full scrape + analysis pipeline for one username."""
+    stages = {}
+    async for stage, result in iter_vibecheck_events(username, max_posts, business_api, caption_analyzer):
+        stages[stage] = result
+    return build_vibecheck_response(stages)
+
+def vibe_cache_key(username: str, max_posts: int) -> str:
+    return f"{username.lower()}:{max_posts}"
+
+class PipelineRun:
+    """Stage results of one in-flight pipeline in completion order, so streams can follow it."""
+    
+    def __init__(self):
+        self.stages: List[Tuple[str, Any]] = []
+        self.finished = False
+        self._updated = asyncio.Event()
+    
+    def publish(self, stage: str, result: Any):
+        self.stages.append((stage, result))
+        self._notify()
+    
+    def finish(self):
+        self.finished = True
+        self._notify()
+    
+    def _notify(self):
+        # Each waiter holds the event from before the change; a fresh one serves the next
+        self._updated.set()
+        self._updated = asyncio.Event()
+    
+    async def follow(self) -> AsyncIterator[Tuple[str, Any]]:
+        """Every stage published so far, then each new one until the run finishes."""
+        seen = 0
+        while True:
+            updated = self._updated
+            while seen < len(self.stages):
+                yield self.stages[seen]
+                seen += 1
+            if self.finished:
+                return
+            await updated.wait()
+
+# Runs of the pipeline tasks currently in pipeline_flights
+_pipeline_runs: Dict[asyncio.Task, PipelineRun] = {}
+
+def start_vibecheck(key: str, username: str, max_posts: int, business_api: InstagramBusinessAPI,
+                    caption_analyzer: Callable = analyze_captions_with_llm) -> Tuple[Optional[PipelineRun], asyncio.Task]:
+    """
+    Start the pipeline for `key`, or join the one in flight: plain and streaming
+    requests share a single run. Returns (run, task); the task resolves to the
+    response, which is cached unless a stage fell back. run is None when the
+    joined task has already finished.
+    """
+    new_run = PipelineRun()
+    
+    async def compute():
+        try:
+            stages = {}
+            async for stage, result in iter_vibecheck_events(username, max_posts, business_api, caption_analyzer):
+                stages[stage] = result
+                new_run.publish(stage, result)
+            response = build_vibecheck_response(stages)
+            if not is_degraded(response):
+                await vibe_cache.aset(key, response)
+            elif is_demo_response(response) and demo_cache.ttl > 0:
+                await demo_cache.aset(key, response)
+            return response
+        finally:
+            new_run.finish()
+    
+    task = pipeline_flights.start(key, compute)
+    if task not in _pipeline_runs and not task.done():
+        _pipeline_runs[task] = new_run
+        task.add_done_callback(lambda t: _pipeline_runs.pop(t, None))
+    return _pipeline_runs.get(task), task
+
+async def _compute_vibecheck(key: str, username: str, max_posts: int, business_api: InstagramBusinessAPI,
+                             caption_analyzer: Callable = analyze_captions_with_llm) -> Dict[str, Any]:
+    """Run the pipeline once for all concurrent callers and store the result (see start_vibecheck)."""
+    _, task = start_vibecheck(key, username, max_posts, business_api, caption_analyzer)
+    return await asyncio.shield(task)
+
+async def _revalidate_vibecheck(key: str, username: str, max_posts: int,
+                                business_api: InstagramBusinessAPI):
+    """Background refresh for a stale cache entry."""
+    try:
+        await _compute_vibecheck(key, username, max_posts, business_api)
+    except Exception as e:
+        print(f"Background refresh for @{username} failed: {e}")
+    finally:
+        _revalidating.discard(key)
+
+async def lookup_cached_vibecheck(key: str, username: str, max_posts: int,
+                                  business_api: InstagramBusinessAPI) -> Optional[Dict[str, Any]]:
+    """
+    Return a cached vibecheck response, or None on a miss.
+    Stale entries are returned immediately while a refresh runs in the background.
+    """
+    cached = await vibe_cache.aget(key) or await demo_cache.aget(key)
+    if cached is None:
+        return None
+    
+    result, fresh = cached
+    if not fresh and key not in _revalidating:
+        _revalidating.add(key)
+        task = asyncio.create_task(_revalidate_vibecheck(key, username, max_posts, business_api))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return result
+
+async def cached_vibecheck(username: str, max_posts: int,
+                           business_api: InstagramBusinessAPI) -> Dict[str, Any]:
+    """Serve a vibecheck from the response cache when possible."""
+    key = vibe_cache_key(username, max_posts)
+    cached = await lookup_cached_vibecheck(key, username, max_posts, business_api)
+    if cached is not None:
+        return cached
+    
+    async with vibecheck_admission.slot():
+        return await _compute_vibecheck(key, username, max_posts, business_api)
+
+async def run_vibecheck_job(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Job handler for /vibecheck/jobs. The worker pool bounds job concurrency, so
+    jobs skip request admission and wait their turn in the job queue instead.
+    """
+    username, max_posts = request["username"], request["max_posts"]
+    key = vibe_cache_key(username, max_posts)
+    business_api = app.state.business_api
+    cached = await lookup_cached_vibecheck(key, username, max_posts, business_api)
+    if cached is not None:
+        return cached
+    try:
+        return await _compute_vibecheck(key, username, max_posts, business_api)
+    except asyncio.TimeoutError:
+        raise RuntimeError("Instagram profile fetch timed out")
+
+# Async jobs: submit returns an ID at once, a local worker pool runs the pipeline
+# (VIBECHECK_JOB_DB keeps the job store in SQLite so queued jobs survive restarts)
+job_pool = JobWorkerPool.from_env(run_vibecheck_job)
+
+def _ndjson_event(event: str, data: Any) -> str:
+    return json.dumps({"event": event, "data": data}, ensure_ascii=False) + "\n"
+
+async def stream_cached_vibecheck(cached: Dict[str, Any]) -> AsyncIterator[str]:
+    """NDJSON lines for a /vibecheck/stream cache hit: every stage at once, then 'done'."""
+    for stage in PIPELINE_STAGES:
+        yield _ndjson_event(stage, cached[stage])
+    yield _ndjson_event("done", {"ok": True, "message": "Analysis complete using Instagram API and AI services!"})
+
+async def stream_vibecheck_events(username: str, max_posts: int, business_api: InstagramBusinessAPI,
+                                  ticket: Optional[AdmissionTicket] = None) -> AsyncIterator[str]:
+    """
+    NDJSON lines for a /vibecheck/stream cache miss: one event per stage, then a final 'done' event.
+    The stream follows the shared pipeline run for the profile, so concurrent requests
+    (streaming or not) run it once; a client going away leaves it to finish and be cached.
+    The admission ticket taken by the endpoint is released when the stream ends.
+    """
+    key = vibe_cache_key(username, max_posts)
+    try:
+        run, task = start_vibecheck(key, username, max_posts, business_api)
+        if run is not None:
+            async for stage, result in run.follow():
+                yield _ndjson_event(stage, result)
+            await asyncio.shield(task)
+        else:
+            response = await asyncio.shield(task)
+            for stage in PIPELINE_STAGES:
+                yield _ndjson_event(stage, response[stage])
+        
+        yield _ndjson_event("done", {"ok": True, "message": "Analysis complete using Instagram API and AI services!"})
+        
+    except asyncio.TimeoutError:
+        print(f"Vibe check scrape timed out after {SCRAPE_STAGE_TIMEOUT}s")
+        yield _ndjson_event("error", {"detail": "Instagram profile fetch timed out. Please try again."})
+    except Exception as e:
+        print(f"Vibe check stream failed: {e}")
+        yield _ndjson_event("error", {"detail": f"Analysis failed: {str(e)}. Please check your API configuration."})
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+def normalize_batch_links(insta_links: List[str]) -> Tuple[List[str], List[str]]:
+    """Usernames from a list of links, de-duplicated case-insensitively in order, plus the invalid links."""
+    usernames, invalid, seen = [], [], set()
+    for link in insta_links:
+        username = extract_username(link)
+        if not username:
+            invalid.append(link)
+        elif username.lower() not in seen:
+            seen.add(username.lower())
+            usernames.append(username)
+    return usernames, invalid
+
+async def stream_vibecheck_batch(usernames: List[str], invalid: List[str], max_posts: int,
+                                 business_api: InstagramBusinessAPI, ticket: AdmissionTicket) -> AsyncIterator[str]:
+    """
+    NDJSON lines for /vibecheck/batch: one 'result' (or 'error') event per profile
+    in completion order, then a 'done' summary. At most VIBECHECK_BATCH_CONCURRENCY
+    profiles run at once; their caption analyses are packed into shared Gemini calls.
+    """
+    semaphore = asyncio.Semaphore(VIBECHECK_BATCH_CONCURRENCY)
+    
+    async def run_one(username: str) -> str:
+        async with semaphore:
+            key = vibe_cache_key(username, max_posts)
+            try:
+                result = await lookup_cached_vibecheck(key, username, max_posts, business_api)
+                if result is None:
+                    result = await _compute_vibecheck(key, username, max_posts, business_api,
+                                                      caption_analyzer=analyze_captions_batched)
+                return _ndjson_event("result", {"username": username, **result})
+            except asyncio.TimeoutError:
+                return _ndjson_event("error", {"username": username, "detail": "Instagram profile fetch timed out"})
+            except Exception as e:
+                print(f"Batch vibe check for @{username} failed: {e}")
+                return _ndjson_event("error", {"username": username, "detail": f"Analysis failed: {str(e)}"})
+    
+    tasks = [asyncio.create_task(run_one(username)) for username in usernames]
+    try:
+        for link in invalid:
+            yield _ndjson_event("error", {"insta_link": link, "detail": "Not a valid Instagram username or profile URL"})
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+        yield _ndjson_event("done", {"ok": True, "profiles": len(usernames), "invalid": len(invalid)})
+    finally:
+        for task in tasks:
+            task.cancel()
+        ticket.release()
+
+def overloaded_response(error: AdmissionRejected) -> HTTPException:
+    """503 with a Retry-After hint for work rejected by admission control."""
+    print(f"Rejecting request: {error}")
+    return HTTPException(
+        status_code=503,
+        detail=f"Server is busy. Please try again in {error.retry_after}s.",
+        headers={"Retry-After": str(error.retry_after)}
+    )
+
 # ---- Main endpoint ----
 @app.post("/vibecheck/")
-async def vibecheck(req: VibeRequest):
+async def vibecheck(req: VibeRequest, business_api: InstagramBusinessAPI = Depends(get_business_api)):
     """Main vibe check endpoint with real AI analysis"""
     # Validate input
     if not req.insta_link:
         raise HTTPException(status_code=400, detail="Provide insta_link")
 
-    if not os.getenv("GEMINI_API_KEY"):
+    if not os.getenv("GEMINI_API_KEY") and not llm_backend_is_fake():
         raise HTTPException(status_code=500, detail="Gemini API key not configured")
 
     try:
         # Extract username and get Instagram data using new API
         username = extract_username(req.insta_link) if req.insta_link else "demo_user"
-        scrape_res = await scrape_instagram_profile(username, max_posts=req.max_posts)
-        
-        # Extract data for analysis
-        captions = [p.get("caption", "") for p in scrape_res.get("posts", [])]
-        image_urls = [p.get("image_url") for p in scrape_res.get("posts", []) if p.get("image_url")]
-        user_bio = scrape_res.get("bio", "")
-        
-        # Perform AI analysis
-        text_analysis = await analyze_captions_with_llm(captions)
-        image_analysis = await analyze_images_with_vision(image_urls)
-        
-        # Combine analysis results
-        analysis_results = {
-            "text_analysis": text_analysis,
-            "image_analysis": image_analysis
-        }
-        
-        # Generate vibe profile and memes
-        vibe_profile = await create_vibe_profile(analysis_results, user_bio, username)
-        memes = await generate_memes(analysis_results, scrape_res.get("posts", []))
-        
-
-        
-        return {
-            "ok": True,
-            "scrape": scrape_res,
-            "text_analysis": text_analysis,
-            "image_analysis": image_analysis,
-
-            "vibe_profile": vibe_profile,
-            "memes": memes,
-            "message": "Analysis complete using Instagram API and AI services!"
-        }
+        return await cached_vibecheck(username, req.max_posts, business_api)
         
     except HTTPException:
         raise
+    except AdmissionRejected as e:
+        raise overloaded_response(e)
+    except asyncio.TimeoutError:
+        print(f"Vibe check scrape timed out after {SCRAPE_STAGE_TIMEOUT}s")
+        raise HTTPException(status_code=504, detail="Instagram profile fetch timed out. Please try again.")
     except Exception as e:
         print(f"Vibe check failed: {e}")
         raise HTTPException(
@@ -375,19 +1152,167 @@ async def vibecheck(req: VibeRequest):
             detail=f"Analysis failed: {str(e)}. Please check your API configuration."
         )
 
+@app.post("/vibecheck/stream")
+async def vibecheck_stream(req: VibeRequest, business_api: InstagramBusinessAPI = Depends(get_business_api)):
+    """
+    Streaming variant of /vibecheck/.
+    Responds with NDJSON, one {"event", "data"} object per pipeline stage as soon as it completes.
+    """
+    if not req.insta_link:
+        raise HTTPException(status_code=400, detail="Provide insta_link")
+
+    if not os.getenv("GEMINI_API_KEY") and not llm_backend_is_fake():
+        raise HTTPException(status_code=500, detail="Gemini API key not configured")
+
+    username = extract_username(req.insta_link)
+    # Cache hits bypass admission control, as on /vibecheck/
+    key = vibe_cache_key(username, req.max_posts)
+    cached = await lookup_cached_vibecheck(key, username, req.max_posts, business_api)
+    if cached is not None:
+        return StreamingResponse(stream_cached_vibecheck(cached), media_type="application/x-ndjson")
+    
+    try:
+        ticket = await vibecheck_admission.acquire()
+    except AdmissionRejected as e:
+        raise overloaded_response(e)
+    
+    # The generator releases the ticket when it finishes; the background task covers
+    # a client that disconnects before the stream starts
+    return StreamingResponse(
+        stream_vibecheck_events(username, req.max_posts, business_api, ticket),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(ticket.release)
+    )
+
+@app.post("/vibecheck/batch")
+async def vibecheck_batch(req: VibeBatchRequest, business_api: InstagramBusinessAPI = Depends(get_business_api)):
+    """
+    Vibe check many profiles in one request.
+    Links are normalized and de-duplicated; results stream back as NDJSON as each profile completes.
+    """
+    if not req.insta_links:
+        raise HTTPException(status_code=400, detail="Provide insta_links")
+    
+    if len(req.insta_links) > VIBECHECK_BATCH_MAX_LINKS:
+        raise HTTPException(status_code=400, detail=f"At most {VIBECHECK_BATCH_MAX_LINKS} links per batch")
+
+    if not os.getenv("GEMINI_API_KEY") and not llm_backend_is_fake():
+        raise HTTPException(status_code=500, detail="Gemini API key not configured")
+
+    usernames, invalid = normalize_batch_links(req.insta_links)
+    # The whole batch counts as one admitted request; its own concurrency bound limits fan-out
+    try:
+        ticket = await vibecheck_admission.acquire()
+    except AdmissionRejected as e:
+        raise overloaded_response(e)
+    
+    return StreamingResponse(
+        stream_vibecheck_batch(usernames, invalid, req.max_posts, business_api, ticket),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(ticket.release)
+    )
+
+@app.post("/vibecheck/jobs", status_code=202)
+async def submit_vibecheck_job(req: VibeJobRequest):
+    """
+    Queue a vibe check and return its job ID immediately.
+    Poll GET /vibecheck/jobs/{job_id}, or pass callback_url to have the finished job POSTed there.
+    """
+    if not req.insta_link:
+        raise HTTPException(status_code=400, detail="Provide insta_link")
+
+    if req.callback_url:
+        try:
+            await job_pool.check_callback_url(req.callback_url)
+        except CallbackRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if not os.getenv("GEMINI_API_KEY") and not llm_backend_is_fake():
+        raise HTTPException(status_code=500, detail="Gemini API key not configured")
+
+    username = extract_username(req.insta_link)
+    try:
+        job = await job_pool.submit({"username": username, "max_posts": req.max_posts},
+                                    priority=req.priority, callback_url=req.callback_url)
+    except JobQueueFull as e:
+        print(f"Rejecting job: {e}")
+        raise HTTPException(status_code=503, detail="Job queue is full. Please try again later.",
+                            headers={"Retry-After": "30"})
+    
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/vibecheck/jobs/{job['id']}"}
+
+@app.get("/vibecheck/jobs/{job_id}")
+async def get_vibecheck_job(job_id: str):
+    """Job status; `result` holds the /vibecheck/ response once status is 'succeeded'."""
+    job = await job_pool.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    return public_job(job)
+
+@app.delete("/vibecheck/jobs/{job_id}")
+async def cancel_vibecheck_job(job_id: str):
+    """Cancel a queued or running job. Finished jobs are returned unchanged."""
+    job = await job_pool.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown or expired)")
+    return public_job(job)
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the /vibecheck/ response cache and request coalescing."""
+    return {
+        "vibecheck": vibe_cache.snapshot(),
+        "vibecheck_demo": demo_cache.snapshot(),
+        "llm_memo": llm_client.memo.snapshot() if llm_client.memo else None,
+        "singleflight": {
+            "pipeline": pipeline_flights.snapshot(),
+            "scrape": scrape_flights.snapshot(),
+            "llm": llm_client.flights.snapshot()
+        },
+        "caption_batcher": caption_batcher.snapshot(),
+        "profile_state": profile_states.snapshot()
+    }
+
+@app.on_event("startup")
+async def startup_clients():
+    # Initialize Instagram Business API once per process
+    business_api = InstagramBusinessAPI()
+    await business_api.start()
+    app.state.business_api = business_api
+    await image_fetcher.start()
+    await job_pool.start()
+    
+    if business_api.page_access_token and business_api.business_account_id:
+        print("✅ Instagram Business API configured with Page Access Token")
+    else:
+        print("⚠️  Instagram Business API needs Page Access Token configuration")
+        print("   See INSTAGRAM_BUSINESS_API_SETUP.md for setup instructions")
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    await job_pool.stop()
+    await app.state.business_api.aclose()
+    await image_fetcher.aclose()
+    llm_client.close()
+    vibe_cache.close()
+    demo_cache.close()
+    profile_states.close()
+
 @app.get("/")
 def root():
     return {
         "status": "Vibe Check AI Backend running",
         "version": "1.0.0",
-        "endpoints": ["/vibecheck/", "/docs", "/instagram-status"],
+        "endpoints": ["/vibecheck/", "/vibecheck/stream", "/vibecheck/batch", "/vibecheck/jobs", "/docs", "/instagram-status", "/cache/stats", "/metrics", "/health"],
         "instagram_api": "Using app credentials for enhanced demo data"
     }
 
 @app.get("/instagram-status")
-def instagram_status():
+async def instagram_status(refresh: bool = False,
+                           business_api: InstagramBusinessAPI = Depends(get_business_api)):
     """
     Diagnostic endpoint to check Instagram API configuration status.
+    Pass ?refresh=true to bypass the cached token validation.
     """
     try:
         # Check if Instagram Business API is configured
@@ -402,7 +1327,7 @@ def instagram_status():
         
         # Test token validation if configured
         if business_api.page_access_token:
-            validation_result = business_api.validate_page_access_token()
+            validation_result = await business_api.get_token_state(force_refresh=refresh)
             status["token_validation"] = validation_result
         else:
             status["token_validation"] = {
@@ -435,8 +1360,31 @@ def instagram_status():
 
 
 @app.get("/health")
-def health():
-    return {"status": "healthy", "timestamp": "2025-01-13"}
+def health(request: Request):
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "uptime_seconds": round(time.monotonic() - STARTED_AT, 1),
+        "admission": {
+            "vibecheck": vibecheck_admission.snapshot(),
+            "gemini": llm_client.admission.snapshot(),
+            "instagram": request.app.state.business_api.http.admission.snapshot()
+        },
+        "rate_limits": {
+            "gemini": llm_client.rate_limiter.snapshot(),
+            "instagram": request.app.state.business_api.http.rate_limiter.snapshot()
+        },
+        "circuits": {
+            "gemini": llm_client.circuit.snapshot(),
+            "instagram": request.app.state.business_api.http.circuit.snapshot()
+        },
+        "jobs": job_pool.snapshot()
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus metrics: per-stage latency histograms, cache and fallback counters."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 if __name__ == "__main__":
     import uvicorn
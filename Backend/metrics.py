@@ -0,0 +1,143 @@
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Request ID of the HTTP request currently being served (set by middleware in main.py)
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+LOG_SPANS = os.getenv("LOG_SPANS", "false").lower() == "true"
+
+# Buckets sized for LLM / network round trips (5 ms .. 60 s)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+FAST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+STAGE_DURATION = Histogram(
+    "vibecheck_stage_duration_seconds", "Duration of /vibecheck/ pipeline stages",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+GRAPH_API_DURATION = Histogram(
+    "graph_api_request_duration_seconds", "Duration of Instagram Graph API calls (including retries)",
+    ["endpoint"], buckets=LATENCY_BUCKETS,
+)
+LLM_DURATION = Histogram(
+    "llm_request_duration_seconds", "Duration of LLM backend calls",
+    ["stage", "model"], buckets=LATENCY_BUCKETS,
+)
+LLM_PARSE_DURATION = Histogram(
+    "llm_parse_duration_seconds", "Time spent parsing and validating LLM replies",
+    ["stage"], buckets=FAST_BUCKETS,
+)
+LLM_PARSE_RESULTS = Counter(
+    "llm_parse_results_total", "LLM reply parse outcomes",
+    ["stage", "outcome"],
+)
+CACHE_LOOKUP_DURATION = Histogram(
+    "cache_lookup_duration_seconds", "Cache lookup latency",
+    ["cache"], buckets=FAST_BUCKETS,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by result",
+    ["cache", "result"],
+)
+FALLBACKS = Counter(
+    "vibecheck_fallbacks_total", "Times a stage served its fallback instead of a real result",
+    ["stage", "reason"],
+)
+INFLIGHT_REQUESTS = Gauge(
+    "http_requests_inflight", "HTTP requests currently being served",
+)
+ADMISSION_LIMIT = Gauge(
+    "admission_limit", "Configured admission limits per pool (concurrency and queue size)",
+    ["pool", "limit"],
+)
+ADMISSION_ACTIVE = Gauge(
+    "admission_active", "Work currently holding an admission slot",
+    ["pool"],
+)
+ADMISSION_QUEUED = Gauge(
+    "admission_queued", "Work waiting for an admission slot",
+    ["pool"],
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Time spent queued before admission",
+    ["pool"], buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Work rejected by admission control",
+    ["pool", "reason"],
+)
+
+RATE_LIMIT_WAIT = Histogram(
+    "rate_limit_wait_seconds", "Time spent waiting for an upstream rate-limit token",
+    ["upstream"], buckets=LATENCY_BUCKETS,
+)
+RATE_LIMIT_EVENTS = Counter(
+    "rate_limit_events_total", "Upstream throttling events (quota pauses, rejected waits)",
+    ["upstream", "event"],
+)
+RATE_LIMIT_RATE = Gauge(
+    "rate_limit_effective_rate", "Current token-bucket refill rate (requests/second) after usage-based throttling",
+    ["upstream"],
+)
+UPSTREAM_USAGE = Gauge(
+    "upstream_quota_usage_percent", "Latest quota usage reported by the upstream (highest of its counters)",
+    ["upstream"],
+)
+
+CIRCUIT_STATE = Gauge(
+    "circuit_state", "Circuit breaker state per upstream (0 = closed, 1 = half-open, 2 = open)",
+    ["upstream"],
+)
+CIRCUIT_TRANSITIONS = Counter(
+    "circuit_transitions_total", "Circuit breaker state changes",
+    ["upstream", "state"],
+)
+CIRCUIT_REJECTED = Counter(
+    "circuit_rejected_total", "Calls short-circuited while a breaker was open",
+    ["upstream"],
+)
+
+
+LOCAL_ANALYSIS = Counter(
+    "local_text_analysis_total",
+    "Caption sets seen by the local analyzer: 'confident' skipped Gemini, 'deferred' went to Gemini",
+    ["outcome"],
+)
+
+CAPTION_PROMPT_TOKENS = Histogram(
+    "caption_prompt_tokens", "Estimated tokens of caption text sent for analysis after preprocessing",
+    buckets=(50, 100, 250, 500, 1000, 1500, 2000, 4000, 8000),
+)
+
+JOB_QUEUE_DEPTH = Gauge("vibecheck_job_queue_depth", "Async vibecheck jobs waiting for a worker")
+JOBS_FINISHED = Counter(
+    "vibecheck_jobs_finished_total", "Async vibecheck jobs by final status",
+    ["status"],
+)
+JOB_RUN_DURATION = Histogram(
+    "vibecheck_job_run_seconds", "Time async vibecheck jobs spent running on a worker",
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+
+
+def record_fallback(stage: str, reason: str = "error"):
+    FALLBACKS.labels(stage=stage, reason=reason).inc()
+
+
+@contextmanager
+def span(name: str, histogram: Histogram, **labels):
+    """
+    Time a block into `histogram` with the given labels.
+    With LOG_SPANS=true, each span is also printed tagged with the request ID.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.labels(**labels).observe(elapsed)
+        if LOG_SPANS:
+            print(f"[{request_id_var.get()}] {name} {labels} {elapsed * 1000:.1f}ms")
@@ -0,0 +1,86 @@
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from cache import TieredCache
+
+
+def kmeans_palettes(pixels: np.ndarray, k: int, iterations: int = 8) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched k-means over several images at once.
+
+    pixels: float32 array of shape (batch, n_pixels, 3).
+    Returns (centroids, counts) with shapes (batch, k, 3) and (batch, k).
+    Centroids are initialised from luminance quantiles so results are deterministic.
+    """
+    batch, n_pixels, _ = pixels.shape
+    luminance = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    order = np.argsort(luminance, axis=1)
+    seeds = order[:, ((np.arange(k) + 0.5) * n_pixels / k).astype(int)]
+    centroids = np.take_along_axis(pixels, seeds[:, :, None], axis=1)
+
+    for _ in range(iterations):
+        # (batch, n_pixels, k) squared distances to every centroid
+        distances = ((pixels[:, :, None, :] - centroids[:, None, :, :]) ** 2).sum(axis=-1)
+        labels = distances.argmin(axis=2)
+        one_hot = (labels[:, :, None] == np.arange(k)).astype(np.float32)
+        counts = one_hot.sum(axis=1)
+        sums = np.einsum("bnk,bnd->bkd", one_hot, pixels)
+        # Empty clusters keep their previous centroid
+        centroids = np.where(counts[:, :, None] > 0, sums / np.maximum(counts, 1)[:, :, None], centroids)
+
+    return centroids, counts
+
+
+def to_hex(color: np.ndarray) -> str:
+    r, g, b = np.clip(np.rint(color), 0, 255).astype(int)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+class PaletteExtractor:
+    """
+    Local color palette extraction for post images.
+    Every image in a profile is downsampled to a fixed grid and clustered in a
+    single vectorized k-means pass. Palettes are cached by image content hash.
+    """
+
+    def __init__(self, colors: int = 3, sample_size: int = 48, iterations: int = 8,
+                 cache: Optional[TieredCache] = None):
+        self.colors = colors
+        self.sample_size = sample_size
+        self.iterations = iterations
+        self.cache = cache or TieredCache(namespace="palette", max_entries=2048, ttl=None)
+
+    @classmethod
+    def from_env(cls) -> "PaletteExtractor":
+        return cls(
+            colors=int(os.getenv("PALETTE_COLORS", "3")),
+            sample_size=int(os.getenv("PALETTE_SAMPLE_SIZE", "48")),
+        )
+
+    def _pixels(self, image: Image.Image) -> np.ndarray:
+        small = image.convert("RGB").resize((self.sample_size, self.sample_size), Image.BILINEAR)
+        return np.asarray(small, dtype=np.float32).reshape(-1, 3)
+
+    def extract_batch(self, images: List[Image.Image], keys: List[str]) -> List[List[str]]:
+        """Return a hex palette (most dominant first) for each image."""
+        palettes: List[Optional[List[str]]] = []
+        missing = []
+        for index, key in enumerate(keys):
+            cached = self.cache.get(key)
+            palettes.append(cached[0] if cached is not None else None)
+            if cached is None:
+                missing.append(index)
+
+        if missing:
+            pixels = np.stack([self._pixels(images[index]) for index in missing])
+            centroids, counts = kmeans_palettes(pixels, self.colors, self.iterations)
+            for row, index in enumerate(missing):
+                ranked = np.argsort(-counts[row])
+                palette = [to_hex(centroids[row, c]) for c in ranked if counts[row, c] > 0]
+                palettes[index] = palette
+                self.cache.set(keys[index], palette)
+
+        return palettes
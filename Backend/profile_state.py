@@ -0,0 +1,112 @@
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import TieredCache
+from instagram_api import media_timestamp
+
+
+def post_key(post: Dict[str, Any]) -> Optional[str]:
+    return post.get("id") or post.get("url")
+
+
+def stored_post(post: Dict[str, Any]) -> Dict[str, Any]:
+    """A post as kept in the store: image_url is a signed CDN link that expires, so it is dropped."""
+    return {key: value for key, value in post.items() if key != "image_url"}
+
+
+def post_window(new_posts: List[Dict[str, Any]], old_posts: List[Dict[str, Any]],
+                max_posts: int) -> List[Dict[str, Any]]:
+    """The newest max_posts posts of new + old (both newest first), without duplicates."""
+    window, seen = [], set()
+    for post in [*new_posts, *old_posts]:
+        key = post_key(post)
+        if key in seen:
+            continue
+        seen.add(key)
+        window.append(post)
+        if len(window) >= max_posts:
+            break
+    return window
+
+
+class ProfileStateStore:
+    """
+    Per-profile analysis state for incremental re-analysis.
+
+    For each (username, max_posts) it keeps the analyzed post window (newest
+    first), the caption analyses that produced it with the IDs of the posts
+    each one covered, and the newest post timestamp seen (the watermark).
+    A refresh fetches only posts newer than the watermark and analyzes just
+    those; posts pushed out of the window take their share of the older
+    analyses with them. Stored posts carry no image URLs (those expire), so
+    callers re-read them for the window. Entries expire after PROFILE_STATE_TTL
+    so deleted or edited posts are eventually picked up by a full re-analysis.
+    Callers must only save a state built from a complete fetch, or the posts
+    between a failed page and the old watermark would never be fetched.
+    """
+
+    def __init__(self, cache: TieredCache):
+        self.cache = cache
+
+    @classmethod
+    def from_env(cls) -> "ProfileStateStore":
+        ttl = float(os.getenv("PROFILE_STATE_TTL", "604800"))
+        return cls(TieredCache(
+            namespace="profile_state",
+            max_entries=int(os.getenv("PROFILE_STATE_MAX_ENTRIES", "1024")),
+            ttl=ttl,
+            stale_ttl=ttl,
+            # Shares the response cache's SQLite file under its own namespace
+            db_path=os.getenv("VIBE_CACHE_DB") or None,
+            max_disk_entries=int(os.getenv("PROFILE_STATE_MAX_DISK_ENTRIES", "20000")),
+        ))
+
+    @staticmethod
+    def key(username: str, max_posts: int) -> str:
+        return f"{username.lower()}:{max_posts}"
+
+    async def get(self, username: str, max_posts: int) -> Optional[Dict[str, Any]]:
+        cached = await self.cache.aget(self.key(username, max_posts))
+        return cached[0] if cached is not None else None
+
+    def apply(self, state: Optional[Dict[str, Any]], new_posts: List[Dict[str, Any]],
+              analyses: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]], max_posts: int) -> Dict[str, Any]:
+        """
+        Fold newly fetched posts and their caption analyses, as (posts, analysis)
+        pairs, into `state` (None on a first run). Returns the new state.
+        """
+        old_posts = state["posts"] if state else []
+        old_analyses = state["analyses"] if state else []
+        posts = post_window(new_posts, old_posts, max_posts)
+
+        live = {post_key(post) for post in posts}
+        merged = []
+        for entry in [
+            *({"post_ids": [post_key(p) for p in chunk], "analysis": analysis} for chunk, analysis in analyses),
+            *old_analyses,
+        ]:
+            post_ids = [post_id for post_id in entry["post_ids"] if post_id in live]
+            if post_ids:
+                merged.append({"post_ids": post_ids, "analysis": entry["analysis"]})
+
+        stamps = [(media_timestamp(post.get("timestamp")), post.get("timestamp")) for post in posts]
+        stamps = [stamp for stamp in stamps if stamp[0] is not None]
+        watermark = max(stamps)[1] if stamps else (state or {}).get("watermark")
+        return {"watermark": watermark, "posts": [stored_post(post) for post in posts], "analyses": merged,
+                "updated_at": time.time()}
+
+    async def save(self, username: str, max_posts: int, state: Dict[str, Any]):
+        await self.cache.aset(self.key(username, max_posts), state)
+
+    @staticmethod
+    def weighted_analyses(state: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[int]]:
+        """Stored analyses, newest first, each weighted by how many window posts it covers."""
+        return ([entry["analysis"] for entry in state["analyses"]],
+                [len(entry["post_ids"]) for entry in state["analyses"]])
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self.cache.snapshot()
+
+    def close(self):
+        self.cache.close()
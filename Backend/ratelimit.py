@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+from typing import Any, Dict, Optional
+
+from metrics import RATE_LIMIT_EVENTS, RATE_LIMIT_RATE, RATE_LIMIT_WAIT, UPSTREAM_USAGE
+
+
+class RateLimited(Exception):
+    """Raised when a call would have to wait longer than the limiter's max_wait for a token."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"{upstream} rate limit: next slot in {retry_after:.1f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens/second up to `burst`.
+    Callers reserve a token up front and sleep off any deficit, so waiters are
+    served in arrival order. The balance may go negative: that is the queue.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it."""
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def next_wait(self) -> float:
+        """How long a reservation made now would wait."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def pause(self, seconds: float):
+        """Hold back all reservations for `seconds` (e.g. from a Retry-After header)."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def set_rate(self, rate: float):
+        self._refill()
+        self.rate = rate
+
+
+class RateLimiter:
+    """
+    Client-side rate limiting for one upstream, with a token bucket per key
+    (model name, access token, ...).
+
+    Bursts queue for a token instead of failing, up to `max_wait` seconds;
+    beyond that RateLimited is raised so callers can fall back immediately.
+    Quota usage reported by the upstream scales the refill rate down once it
+    passes `soft_limit` percent, so we slow down before the hard limit.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float = 10, max_wait: Optional[float] = 10.0,
+                 soft_limit: float = 75.0):
+        self.name = name
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_wait = max_wait
+        self.soft_limit = soft_limit
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.stats = {"immediate": 0, "delayed": 0, "rejected": 0, "pauses": 0}
+        RATE_LIMIT_RATE.labels(upstream=name).set(rate)
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str, rate: float, burst: float = 10,
+                 max_wait: Optional[float] = 10.0) -> "RateLimiter":
+        """Read {prefix}_RATE_LIMIT (requests/second), {prefix}_RATE_BURST and {prefix}_RATE_MAX_WAIT."""
+        max_wait_env = os.getenv(f"{prefix}_RATE_MAX_WAIT")
+        if max_wait_env is not None:
+            max_wait = float(max_wait_env) if max_wait_env.strip() else None
+        return cls(
+            name,
+            rate=float(os.getenv(f"{prefix}_RATE_LIMIT", str(rate))),
+            burst=float(os.getenv(f"{prefix}_RATE_BURST", str(burst))),
+            max_wait=max_wait,
+            soft_limit=float(os.getenv(f"{prefix}_QUOTA_SOFT_LIMIT", "75")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def acquire(self, key: str = "default"):
+        """Wait for a token for `key`; raises RateLimited if that would exceed max_wait."""
+        if not self.enabled:
+            return
+        bucket = self._bucket(key)
+        if self.max_wait is not None and bucket.next_wait() > self.max_wait:
+            self.stats["rejected"] += 1
+            RATE_LIMIT_EVENTS.labels(upstream=self.name, event="rejected").inc()
+            raise RateLimited(self.name, bucket.next_wait())
+
+        wait = bucket.reserve()
+        if not wait:
+            self.stats["immediate"] += 1
+            return
+        self.stats["delayed"] += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            bucket.refund()
+            raise
+        finally:
+            RATE_LIMIT_WAIT.labels(upstream=self.name).observe(wait)
+
+    def pause(self, key: str, seconds: float):
+        """The upstream told us to back off (429 / Retry-After / quota exhausted)."""
+        if not self.enabled or seconds <= 0:
+            return
+        self.stats["pauses"] += 1
+        RATE_LIMIT_EVENTS.labels(upstream=self.name, event="paused").inc()
+        self._bucket(key).pause(seconds)
+
+    def observe_usage(self, key: str, percent: float):
+        """Adapt the refill rate for `key` to the quota usage (0-100) the upstream reported."""
+        UPSTREAM_USAGE.labels(upstream=self.name).set(percent)
+        if not self.enabled:
+            return
+        factor = 1.0
+        if percent > self.soft_limit:
+            factor = max(0.1, (100 - percent) / (100 - self.soft_limit))
+        rate = self.rate * factor
+        self._bucket(key).set_rate(rate)
+        RATE_LIMIT_RATE.labels(upstream=self.name).set(rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "rate": self.rate,
+            "burst": self.burst,
+            "max_wait": self.max_wait,
+            "keys": len(self._buckets),
+            "effective_rates": {key: round(bucket.rate, 3) for key, bucket in self._buckets.items()},
+        }
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+# Backend modules are imported top-level, as when running from Backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main builds its clients from the environment at import time: fake LLM, dummy
+# Instagram credentials, no outbound rate limiting or retries
+os.environ.update(LLM_BACKEND="fake", FAKE_LLM_LATENCY="0", INSTAGRAM_APP_ID="test", INSTAGRAM_APP_SECRET="test",
+                  INSTAGRAM_PAGE_ACCESS_TOKEN="token", INSTAGRAM_BUSINESS_ACCOUNT_ID="42",
+                  GRAPH_API_RATE_LIMIT="0", GRAPH_API_MAX_RETRIES="0", VIBECHECK_INCREMENTAL="true")
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def fixture_bytes():
+    """Read a file from tests/fixtures."""
+    def read(name: str) -> bytes:
+        with open(os.path.join(FIXTURES, name), "rb") as f:
+            return f.read()
+    return read
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+    async def run():
+        pool = AdmissionController("test_handoff", max_concurrent=1)
+        holder = await pool.acquire()
+        order = []
+
+        async def wait(name):
+            ticket = await pool.acquire()
+            order.append(name)
+            ticket.release()
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        assert pool.snapshot()["queued"] == 2
+        holder.release()
+        holder.release()  # idempotent
+        await asyncio.gather(*waiters)
+        return order, pool.snapshot()
+
+    order, snapshot = asyncio.run(run())
+    assert order == ["first", "second"]
+    assert (snapshot["active"], snapshot["queued"]) == (0, 0)
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def run():
+        pool = AdmissionController("test_full", max_concurrent=1, max_queue=1)
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(AdmissionRejected) as rejected:
+                await pool.acquire()
+            return rejected.value
+        finally:
+            waiter.cancel()
+
+    rejected = asyncio.run(run())
+    assert rejected.reason == "queue_full"
+    assert rejected.retry_after >= 1
+
+
+def test_timed_out_waiter_leaves_the_queue():
+    async def run():
+        pool = AdmissionController("test_timeout", max_concurrent=1, queue_timeout=0.01)
+        holder = await pool.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await pool.acquire()
+        assert pool.snapshot()["queued"] == 0
+        holder.release()
+        # The slot is free again rather than handed to the abandoned waiter
+        (await pool.acquire()).release()
+        return rejected.value, pool.snapshot()
+
+    rejected, snapshot = asyncio.run(run())
+    assert rejected.reason == "timeout"
+    assert snapshot["active"] == 0
+    assert snapshot["rejected_timeout"] == 1
@@ -0,0 +1,38 @@
+from caption_prep import CaptionPreprocessor, estimate_tokens, spread_order
+
+
+def test_spread_order_samples_across_the_timeline():
+    assert spread_order(10) == [0, 8, 4, 2, 6, 1, 3, 5, 7, 9]
+    assert sorted(spread_order(7)) == list(range(7))
+    assert spread_order(0) == []
+
+
+def test_hashtags_and_emojis_become_counts():
+    prepared = CaptionPreprocessor().prepare([
+        "Library again ☕ #study #Coffee",
+        "Exam week 📚 #study",
+        "Sunday reset ☕️ #study @friend https://example.com/x",
+    ])
+    assert prepared.text == (
+        "Library again | Exam week | Sunday reset\n"
+        "Hashtags: #study x3, #coffee. Emojis: ☕ x2, 📚"
+    )
+
+
+def test_near_duplicates_are_dropped():
+    prepared = CaptionPreprocessor().prepare([
+        "Day 3 in Bali and the sunsets are unreal",
+        "Day 4 in Bali and the sunsets are unreal",
+        "Back home, missing the beach already",
+    ])
+    assert prepared.stats["duplicates"] == 1
+    assert prepared.text.count("Bali") == 1
+
+
+def test_prompt_stays_within_the_token_budget():
+    captions = [f"caption number {i} about a completely different topic {'word' * i}" for i in range(60)]
+    prepared = CaptionPreprocessor(token_budget=100, max_caption_tokens=20).prepare(captions)
+    assert prepared.stats["captions"] == 60
+    assert 0 < prepared.stats["kept"] < 60
+    assert estimate_tokens(prepared.text) <= 100
+    assert all(len(part) <= 20 * 4 + 1 for part in prepared.text.split(" | "))
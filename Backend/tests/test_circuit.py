@@ -0,0 +1,56 @@
+import pytest
+
+from circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+def fail(breaker: CircuitBreaker, times: int):
+    for _ in range(times):
+        breaker.allow()
+        breaker.record(False)
+
+
+def test_consecutive_failures_open_the_circuit():
+    breaker = CircuitBreaker("test_open", failure_threshold=3, reset_timeout=60)
+    fail(breaker, 2)
+    breaker.allow()
+    breaker.record(True)  # a success resets the streak
+    fail(breaker, 2)
+    assert breaker.state == CLOSED
+
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpen) as rejected:
+        breaker.allow()
+    assert 0 < rejected.value.retry_after <= 60
+    assert breaker.stats["short_circuited"] == 1
+
+
+def test_half_open_admits_limited_probes_and_closes_on_success():
+    breaker = CircuitBreaker("test_probe", failure_threshold=1, reset_timeout=0, half_open_max_calls=1)
+    fail(breaker, 1)
+    breaker.allow()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker("test_reopen", failure_threshold=1, reset_timeout=0)
+    fail(breaker, 1)
+    breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.stats["opened"] == 2
+
+
+def test_neutral_outcomes_free_the_probe_without_deciding():
+    breaker = CircuitBreaker("test_neutral", failure_threshold=1, reset_timeout=0)
+    fail(breaker, 1)
+    breaker.allow()
+    breaker.record(None)
+    assert breaker.state == HALF_OPEN
+    breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+
+import httpx
+
+from image_cache import ImageCache
+from image_pipeline import ImageFetcher, decode_thumbnail
+
+PHOTO_URL = "https://cdn.example.com/photo.jpg"
+
+
+def test_decode_thumbnail_downscales_keeping_aspect_ratio(fixture_bytes):
+    image = decode_thumbnail(fixture_bytes("photo.jpg"), size=256)
+    assert image.mode == "RGB"
+    assert image.size == (256, 171)
+
+
+def test_decode_thumbnail_leaves_small_images_alone(fixture_bytes):
+    image = decode_thumbnail(fixture_bytes("solid_red.png"), size=256)
+    assert image.size == (64, 64)
+    assert image.getpixel((10, 10)) == (255, 0, 0)
+
+
+class ImageServer:
+    """MockTransport handler serving one fixture image with an ETag."""
+
+    def __init__(self, data: bytes, etag: str = '"v1"'):
+        self.data = data
+        self.etag = etag
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.headers.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        return httpx.Response(200, content=self.data, headers={"ETag": self.etag})
+
+
+def fetch(fetcher: ImageFetcher, url: str):
+    async def run():
+        try:
+            return await fetcher.fetch_thumbnail(url)
+        finally:
+            await fetcher.aclose()
+    return asyncio.run(run())
+
+
+def test_fetch_decodes_and_hashes(fixture_bytes):
+    data = fixture_bytes("photo.jpg")
+    server = ImageServer(data)
+    thumb = fetch(ImageFetcher(thumbnail_size=128, transport=httpx.MockTransport(server)), PHOTO_URL)
+    assert thumb.image.size == (128, 85)
+    assert thumb.content_hash == hashlib.sha256(data).hexdigest()
+    assert len(server.requests) == 1
+
+
+def test_fresh_cache_hit_skips_the_network(fixture_bytes, tmp_path):
+    server = ImageServer(fixture_bytes("photo.jpg"))
+    transport = httpx.MockTransport(server)
+    first = fetch(ImageFetcher(cache=ImageCache(str(tmp_path)), transport=transport), PHOTO_URL)
+
+    second = fetch(ImageFetcher(cache=ImageCache(str(tmp_path)), transport=transport), PHOTO_URL)
+    assert len(server.requests) == 1
+    assert second.content_hash == first.content_hash
+    assert second.image.tobytes() == first.image.tobytes()
+
+
+def test_stale_cache_entry_is_revalidated_with_etag(fixture_bytes, tmp_path):
+    server = ImageServer(fixture_bytes("photo.jpg"))
+    transport = httpx.MockTransport(server)
+    first = fetch(ImageFetcher(cache=ImageCache(str(tmp_path), fresh_ttl=0), transport=transport), PHOTO_URL)
+
+    second = fetch(ImageFetcher(cache=ImageCache(str(tmp_path), fresh_ttl=0), transport=transport), PHOTO_URL)
+    assert [r.headers.get("If-None-Match") for r in server.requests] == [None, '"v1"']
+    assert second.content_hash == first.content_hash
+    assert second.image.tobytes() == first.image.tobytes()
+
+
+def test_changed_image_replaces_stale_cache_entry(fixture_bytes, tmp_path):
+    transport = httpx.MockTransport(ImageServer(fixture_bytes("solid_red.png"), etag='"red"'))
+    fetch(ImageFetcher(cache=ImageCache(str(tmp_path), fresh_ttl=0), transport=transport), PHOTO_URL)
+
+    server = ImageServer(fixture_bytes("solid_blue.png"), etag='"blue"')
+    thumb = fetch(ImageFetcher(cache=ImageCache(str(tmp_path), fresh_ttl=0),
+                               transport=httpx.MockTransport(server)), PHOTO_URL)
+    assert server.requests[0].headers.get("If-None-Match") == '"red"'
+    assert thumb.image.getpixel((0, 0)) == (30, 144, 255)
+
+
+def test_llm_memo_keys_images_by_content_hash(fixture_bytes):
+    from cache import TieredCache
+    from llm_client import LLMClient
+
+    class CountingBackend:
+        model_name = "counting"
+
+        def __init__(self):
+            self.calls = 0
+
+        async def generate(self, prompt, images, json_mode):
+            self.calls += 1
+            return "[]"
+
+    data = fixture_bytes("photo.jpg")
+    thumb = fetch(ImageFetcher(transport=httpx.MockTransport(ImageServer(data))), PHOTO_URL)
+    def no_pixel_hashing():
+        raise AssertionError("memo key hashed pixel data")
+    thumb.image.tobytes = no_pixel_hashing
+    backend = CountingBackend()
+    client = LLMClient(backend, memo=TieredCache("llm_test", ttl=None))
+
+    async def run():
+        for _ in range(2):
+            await client.generate("describe", images=[thumb.image], image_keys=[thumb.content_hash])
+    asyncio.run(run())
+
+    assert backend.calls == 1
+    assert client.prompt_key("describe", [thumb.content_hash]) != client.prompt_key("describe")
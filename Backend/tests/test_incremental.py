@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+
+import main
+from http_client import GraphHTTPClient
+from instagram_api import InstagramBusinessAPI, media_timestamp
+
+
+def media(media_id: str, day: int):
+    return {"id": media_id, "caption": f"{media_id} coffee", "media_type": "IMAGE",
+            "media_url": f"https://cdn.example.com/{media_id}.jpg?signed={day}",
+            "permalink": f"https://www.instagram.com/p/{media_id}/", "timestamp": f"2025-01-{day:02d}T12:00:00+0000"}
+
+
+class GraphStub:
+    """/me, cursor-paged /{id}/media honouring `since`, and ?ids= lookups; /media fails when told to."""
+
+    def __init__(self, posts):
+        self.posts = posts
+        self.fail_after = None
+        self.url_version = "v2"
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        if request.url.path.endswith("/me"):
+            return httpx.Response(200, json={"id": "1", "name": "Page"})
+        if params.get("ids"):
+            return httpx.Response(200, json={
+                media_id: {"id": media_id, "media_url": f"https://cdn.example.com/{media_id}.jpg?{self.url_version}"}
+                for media_id in params["ids"].split(",")
+            })
+        offset = int(params.get("after", "0"))
+        if self.fail_after is not None and offset >= self.fail_after:
+            return httpx.Response(500, json={"error": {"message": "boom", "code": 2}})
+        since = int(params.get("since", "0"))
+        newest_first = sorted(self.posts, key=lambda p: p["timestamp"], reverse=True)
+        matching = [p for p in newest_first
+                    if media_timestamp(p["timestamp"]) > since]
+        limit = int(params["limit"])
+        body = {"data": matching[offset:offset + limit]}
+        if offset + limit < len(matching):
+            body["paging"] = {"next": str(request.url.copy_merge_params({"after": offset + limit}))}
+        return httpx.Response(200, json=body)
+
+
+def run(scenario):
+    async def wrapper():
+        main.image_fetcher.transport = httpx.MockTransport(lambda request: httpx.Response(404))
+        async with main.app.router.lifespan_context(main.app):
+            return await scenario()
+    return asyncio.run(wrapper())
+
+
+def business_api(graph: GraphStub) -> InstagramBusinessAPI:
+    api = InstagramBusinessAPI(http_client=GraphHTTPClient(transport=httpx.MockTransport(graph), max_retries=0))
+    api.page_size = 2
+    return api
+
+
+def post_ids(response):
+    return [post["id"] for post in response["scrape"]["posts"]]
+
+
+def test_failed_page_keeps_watermark_and_marks_response_degraded():
+    graph = GraphStub([media(f"p{i}", i + 1) for i in range(6)])
+
+    async def scenario():
+        api = business_api(graph)
+        await main.run_vibecheck_pipeline("partial", 6, api)
+        watermark = (await main.profile_states.get("partial", 6))["watermark"]
+
+        graph.posts += [media(f"n{i}", 10 + i) for i in range(4)]
+        graph.fail_after = 2
+        partial = await main.run_vibecheck_pipeline("partial", 6, api)
+        assert partial["scrape"]["complete"] is False
+        assert main.is_degraded(partial)
+        assert (await main.profile_states.get("partial", 6))["watermark"] == watermark
+
+        graph.fail_after = None
+        clean = await main.run_vibecheck_pipeline("partial", 6, api)
+        assert not main.is_degraded(clean)
+        assert post_ids(clean) == ["n3", "n2", "n1", "n0", "p5", "p4"]
+    run(scenario)
+
+
+def test_failed_delta_fetch_serves_stored_posts_as_degraded():
+    graph = GraphStub([media(f"p{i}", i + 1) for i in range(4)])
+
+    async def scenario():
+        api = business_api(graph)
+        await main.run_vibecheck_pipeline("failing", 4, api)
+        graph.fail_after = 0
+        response = await main.run_vibecheck_pipeline("failing", 4, api)
+        assert response["scrape"]["new_posts"] == 0
+        assert post_ids(response) == ["p3", "p2", "p1", "p0"]
+        assert main.is_degraded(response)
+    run(scenario)
+
+
+def test_stored_posts_get_fresh_media_urls():
+    graph = GraphStub([media(f"p{i}", i + 1) for i in range(3)])
+
+    async def scenario():
+        api = business_api(graph)
+        await main.run_vibecheck_pipeline("urls", 3, api)
+        state = await main.profile_states.get("urls", 3)
+        assert all("image_url" not in post for post in state["posts"])
+
+        graph.url_version = "v3"
+        response = await main.run_vibecheck_pipeline("urls", 3, api)
+        assert [post["image_url"] for post in response["scrape"]["posts"]] == [
+            f"https://cdn.example.com/p{i}.jpg?v3" for i in (2, 1, 0)
+        ]
+        assert not main.is_degraded(response)
+    run(scenario)
@@ -0,0 +1,73 @@
+import asyncio
+
+from jobs import JobWorkerPool, SQLiteJobStore
+
+
+def test_sqlite_jobs_run_by_priority_and_skip_cancelled(tmp_path):
+    started = []
+    gate = None
+
+    async def handler(request):
+        started.append(request["username"])
+        if request["username"] == "blocker":
+            await gate.wait()
+        return {"ok": True, "username": request["username"]}
+
+    async def run():
+        nonlocal gate
+        gate = asyncio.Event()
+        pool = JobWorkerPool(SQLiteJobStore(str(tmp_path / "jobs.db"), ttl=60), handler, workers=1)
+        await pool.start()
+        try:
+            # The single worker is busy with the blocker while the rest queue up
+            await pool.submit({"username": "blocker"})
+            low = await pool.submit({"username": "low"}, priority="low")
+            cancelled = await pool.submit({"username": "cancelled"}, priority="high")
+            high = await pool.submit({"username": "high"}, priority="high")
+            assert (await pool.cancel(cancelled["id"]))["status"] == "cancelled"
+            gate.set()
+
+            for _ in range(200):
+                jobs = [await pool.get(job["id"]) for job in (low, cancelled, high)]
+                if all(job["status"] in ("succeeded", "cancelled") for job in jobs):
+                    return jobs
+                await asyncio.sleep(0.01)
+            raise AssertionError(f"jobs did not finish: {jobs}")
+        finally:
+            await pool.stop()
+
+    low, cancelled, high = asyncio.run(run())
+    assert started == ["blocker", "high", "low"]
+    assert (low["status"], high["status"], cancelled["status"]) == ("succeeded", "succeeded", "cancelled")
+    assert high["result"] == {"ok": True, "username": "high"}
+
+
+def test_cancelled_jobs_free_queue_capacity():
+    from jobs import JobQueueFull, MemoryJobStore
+
+    async def handler(request):
+        await asyncio.Event().wait()
+
+    async def run():
+        pool = JobWorkerPool(MemoryJobStore(ttl=60), handler, workers=1, max_queue=2)
+        await pool.start()
+        try:
+            await pool.submit({"username": "running"})
+            await asyncio.sleep(0)
+            first = await pool.submit({"username": "first"})
+            await pool.submit({"username": "second"})
+            try:
+                await pool.submit({"username": "rejected"})
+                raise AssertionError("queue limit not enforced")
+            except JobQueueFull:
+                pass
+
+            await pool.cancel(first["id"])
+            await pool.cancel(first["id"])
+            await pool.submit({"username": "third"})
+            return pool.snapshot()
+        finally:
+            await pool.stop()
+
+    snapshot = asyncio.run(run())
+    assert (snapshot["queued"], snapshot["running"]) == (2, 1)
@@ -0,0 +1,52 @@
+from typing import List
+
+import pytest
+
+from llm_parsing import (
+    ImageDescription, LLMParseError, MemeText, TextAnalysis, extract_json, parse_llm_response,
+)
+
+
+def test_plain_and_fenced_json():
+    assert extract_json('{"a": 1}') == ({"a": 1}, False)
+    assert extract_json('```json\n{"a": 1}\n```') == ({"a": 1}, False)
+
+
+def test_leading_prose_and_trailing_text_are_salvaged():
+    assert extract_json('Sure! Here you go: {"a": [1, 2]} hope that helps') == ({"a": [1, 2]}, True)
+
+
+def test_truncated_object_is_closed():
+    result = parse_llm_response("test", '{"dominant_sentiment": "positive", "topics": ["coffee", "stu', TextAnalysis)
+    assert result.dominant_sentiment == "positive"
+    assert result.topics == ["coffee", "stu"]
+
+
+def test_truncated_object_missing_required_field_is_rejected():
+    # Every repair leaves "topics" out, so no reading validates
+    with pytest.raises(LLMParseError):
+        parse_llm_response("test", '{"dominant_sentiment": "positive", "top', TextAnalysis)
+
+
+def test_truncated_array_drops_the_cut_off_element():
+    text = '[{"caption": "x", "meme_text": "y"}, {"caption": "z", "meme_t'
+    result = parse_llm_response("memes", text, List[MemeText])
+    assert [meme.model_dump() for meme in result] == [{"caption": "x", "meme_text": "y"}]
+
+
+def test_truncated_array_keeps_every_complete_element():
+    text = '[{"description": "a"}, {"description": "b", "mood": "cozy"}, {"description": "c", "objects": ["cu'
+    result = parse_llm_response("images", text, List[ImageDescription])
+    assert [item.description for item in result] == ["a", "b", "c"]
+
+
+def test_off_schema_reply_is_rejected():
+    with pytest.raises(LLMParseError):
+        parse_llm_response("test", '{"error": "quota"}', TextAnalysis)
+    with pytest.raises(LLMParseError):
+        parse_llm_response("memes", '[{"error": "quota"}]', List[MemeText])
+
+
+def test_no_json_is_rejected():
+    with pytest.raises(LLMParseError):
+        parse_llm_response("test", "I cannot help with that.", TextAnalysis)
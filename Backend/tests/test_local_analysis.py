@@ -0,0 +1,34 @@
+from local_analysis import LocalTextAnalyzer
+
+COFFEE_CAPTIONS = [
+    "Love this latte art ☕ #coffee",
+    "Best espresso in town, so happy #coffee #cafe",
+    "Morning coffee and good vibes ✨",
+    "Cozy cafe afternoon with the best cappuccino 😍",
+]
+
+
+def test_consistent_captions_are_analyzed_confidently():
+    result = LocalTextAnalyzer().analyze(COFFEE_CAPTIONS)
+    assert result.analysis["dominant_sentiment"] == "positive"
+    assert result.analysis["topics"][0] == "coffee"
+    assert "coffee" in result.analysis["keywords"]
+    assert result.confidence >= 0.7
+
+
+def test_negation_flips_sentiment():
+    result = LocalTextAnalyzer().analyze(["not happy with this at all", "never fun, not good"])
+    assert result.analysis["dominant_sentiment"] == "negative"
+
+
+def test_captions_without_signal_have_low_confidence():
+    result = LocalTextAnalyzer().analyze(["Tuesday.", "Another one", "Here we are"])
+    assert result.analysis["dominant_sentiment"] == "neutral"
+    assert result.analysis["topics"] == []
+    assert result.confidence < 0.7
+
+
+def test_no_captions_is_a_confident_empty_analysis():
+    result = LocalTextAnalyzer().analyze(["", "   "])
+    assert result.analysis == {"dominant_sentiment": "neutral", "topics": [], "style": "minimal", "keywords": []}
+    assert result.confidence == 1.0
@@ -0,0 +1,54 @@
+import numpy as np
+from PIL import Image
+
+from image_pipeline import decode_thumbnail
+from palette import PaletteExtractor, kmeans_palettes
+
+
+def rgb(hex_color: str):
+    return tuple(int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def close_to(hex_color: str, expected: str, tolerance: int = 4) -> bool:
+    return all(abs(a - b) <= tolerance for a, b in zip(rgb(hex_color), rgb(expected)))
+
+
+def test_solid_colors_give_single_color_palettes(fixture_bytes):
+    images = [decode_thumbnail(fixture_bytes(name)) for name in ("solid_red.png", "solid_blue.png")]
+    palettes = PaletteExtractor().extract_batch(images, ["red", "blue"])
+    assert palettes == [["#ff0000"], ["#1e90ff"]]
+
+
+def test_two_tone_palette_leads_with_both_colors(fixture_bytes):
+    image = decode_thumbnail(fixture_bytes("two_tone.png"))
+    palette = PaletteExtractor().extract_batch([image], ["two_tone"])[0]
+    # Resampling blends the seam, which can pull a centroid off by a unit or two
+    leading = sorted(palette[:2], key=lambda color: rgb(color)[0])
+    assert close_to(leading[0], "#1e90ff") and close_to(leading[1], "#ffd700")
+
+
+def test_palettes_are_cached_by_key(fixture_bytes):
+    extractor = PaletteExtractor()
+    red = decode_thumbnail(fixture_bytes("solid_red.png"))
+    assert extractor.extract_batch([red], ["same-hash"]) == [["#ff0000"]]
+    # A cache hit skips clustering, so a different image under the same key gets the cached palette
+    blue = Image.new("RGB", (8, 8), (0, 0, 255))
+    assert extractor.extract_batch([blue], ["same-hash"]) == [["#ff0000"]]
+
+
+def test_kmeans_clusters_each_image_independently():
+    # 3 dark pixels + 1 bright one, and the reverse, clustered in one batch
+    dark, bright = [10.0, 10.0, 10.0], [250.0, 250.0, 250.0]
+    pixels = np.array([[dark, dark, dark, bright], [bright, bright, bright, dark]], dtype=np.float32)
+    centroids, counts = kmeans_palettes(pixels, k=2)
+    assert counts.tolist() == [[3, 1], [1, 3]]
+    assert np.allclose(centroids[0], [dark, bright]) and np.allclose(centroids[1], [dark, bright])
+
+
+def test_batch_mixes_cached_and_new_palettes_in_order(fixture_bytes):
+    extractor = PaletteExtractor()
+    red, blue = (decode_thumbnail(fixture_bytes(name)) for name in ("solid_red.png", "solid_blue.png"))
+    extractor.extract_batch([blue], ["blue"])
+    assert extractor.extract_batch([red, blue, red], ["red", "blue", "red-again"]) == [
+        ["#ff0000"], ["#1e90ff"], ["#ff0000"]
+    ]
@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_unknown_pipeline_mode_fails_at_startup():
+    env = {**os.environ, "VIBECHECK_PIPELINE_MODE": "fussed"}
+    result = subprocess.run([sys.executable, "-c", "import main"], cwd=BACKEND, env=env,
+                            capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "VIBECHECK_PIPELINE_MODE must be one of standard, fused, fully_fused" in result.stderr
@@ -0,0 +1,51 @@
+import asyncio
+
+from cache import TieredCache
+from profile_state import ProfileStateStore, post_window
+
+
+def post(n: int):
+    return {"id": f"p{n}", "caption": f"post {n}", "timestamp": f"2026-01-{n:02d}T12:00:00+0000",
+            "image_url": f"https://cdn.example.com/p{n}.jpg?sig=abc"}
+
+
+def store():
+    return ProfileStateStore(TieredCache("profile_state_test", ttl=None))
+
+
+def test_post_window_keeps_newest_without_duplicates():
+    window = post_window([post(5), post(4)], [post(4), post(3), post(2)], max_posts=3)
+    assert [p["id"] for p in window] == ["p5", "p4", "p3"]
+
+
+def test_apply_drops_analyses_of_posts_pushed_out_of_the_window():
+    states = store()
+    first = states.apply(None, [post(3), post(2), post(1)], [([post(3), post(2), post(1)], {"run": 1})], max_posts=3)
+    assert first["watermark"] == post(3)["timestamp"]
+    assert all("image_url" not in p for p in first["posts"])
+
+    second = states.apply(first, [post(5), post(4)], [([post(5), post(4)], {"run": 2})], max_posts=3)
+    assert [p["id"] for p in second["posts"]] == ["p5", "p4", "p3"]
+    assert second["watermark"] == post(5)["timestamp"]
+    analyses, weights = ProfileStateStore.weighted_analyses(second)
+    assert analyses == [{"run": 2}, {"run": 1}]
+    assert weights == [2, 1]
+
+
+def test_empty_delta_keeps_the_previous_watermark():
+    states = store()
+    first = states.apply(None, [post(2)], [([post(2)], {"run": 1})], max_posts=3)
+    assert states.apply(first, [], [], max_posts=3)["watermark"] == first["watermark"]
+
+
+def test_state_round_trips_per_username_and_window_size():
+    states = store()
+    state = states.apply(None, [post(1)], [([post(1)], {"run": 1})], max_posts=5)
+
+    async def run():
+        await states.save("SomeUser", 5, state)
+        return await states.get("someuser", 5), await states.get("someuser", 10)
+
+    saved, other_window = asyncio.run(run())
+    assert saved == state
+    assert other_window is None
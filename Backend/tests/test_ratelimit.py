@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from ratelimit import RateLimited, RateLimiter, TokenBucket
+
+
+def test_burst_is_served_then_calls_beyond_max_wait_fail_fast():
+    limiter = RateLimiter("test_burst", rate=1, burst=2, max_wait=0)
+
+    async def run():
+        await limiter.acquire("a")
+        await limiter.acquire("a")
+        with pytest.raises(RateLimited) as limited:
+            await limiter.acquire("a")
+        # Buckets are per key
+        await limiter.acquire("b")
+        return limited.value
+
+    limited = asyncio.run(run())
+    assert 0 < limited.retry_after <= 1
+    assert (limiter.stats["immediate"], limiter.stats["rejected"]) == (3, 1)
+
+
+def test_pause_holds_back_reservations():
+    bucket = TokenBucket(rate=10, burst=10)
+    bucket.pause(2)
+    assert bucket.next_wait() == pytest.approx(2, abs=0.05)
+
+
+def test_usage_past_the_soft_limit_slows_the_bucket():
+    limiter = RateLimiter("test_usage", rate=10, soft_limit=75)
+    limiter.observe_usage("token", 50)
+    assert limiter.snapshot()["effective_rates"]["token"] == 10
+    limiter.observe_usage("token", 90)
+    assert limiter.snapshot()["effective_rates"]["token"] == pytest.approx(4)
+    limiter.observe_usage("token", 100)
+    assert limiter.snapshot()["effective_rates"]["token"] == pytest.approx(1)
+
+
+def test_rate_zero_disables_limiting():
+    limiter = RateLimiter("test_disabled", rate=0, burst=1, max_wait=0)
+
+    async def run():
+        for _ in range(5):
+            await limiter.acquire()
+    asyncio.run(run())
+    limiter.pause("default", 30)
+    assert limiter.snapshot()["keys"] == 0
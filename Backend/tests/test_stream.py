@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import httpx
+
+import main
+from admission import AdmissionRejected
+
+
+def stream_events(username: str):
+    async def run():
+        main.app.state.business_api = object()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/vibecheck/stream", json={"insta_link": username, "max_posts": 3})
+            if response.status_code != 200:
+                return response.status_code, []
+            return response.status_code, [json.loads(line)["event"] for line in response.text.splitlines() if line]
+    return asyncio.run(run())
+
+
+def cached_response(username: str):
+    return {"ok": True, "message": "cached", "scrape": {"username": username, "posts": []},
+            "text_analysis": {}, "image_analysis": [], "vibe_profile": {}, "memes": []}
+
+
+def test_cache_hit_streams_without_admission(monkeypatch):
+    main.vibe_cache.set(main.vibe_cache_key("cachedstream", 3), cached_response("cachedstream"))
+
+    async def reject():
+        raise AdmissionRejected("vibecheck", "queue full", 5)
+    monkeypatch.setattr(main.vibecheck_admission, "acquire", reject)
+
+    status, events = stream_events("cachedstream")
+    assert status == 200
+    assert events == [*main.PIPELINE_STAGES, "done"]
+
+
+def test_cache_miss_is_rejected_when_overloaded(monkeypatch):
+    async def reject():
+        raise AdmissionRejected("vibecheck", "queue full", 5)
+    monkeypatch.setattr(main.vibecheck_admission, "acquire", reject)
+
+    status, _ = stream_events("uncachedstream")
+    assert status == 503
+
+
+def test_concurrent_requests_share_one_pipeline_run():
+    from benchmark import FakeGraphAPI
+    from http_client import GraphHTTPClient
+    from instagram_api import InstagramBusinessAPI
+
+    graph = FakeGraphAPI(latency=0.05, error_rate=0.0)
+    image_requests = []
+
+    def cdn(request: httpx.Request) -> httpx.Response:
+        image_requests.append(request.url)
+        return httpx.Response(404)
+
+    async def run():
+        main.image_fetcher.transport = httpx.MockTransport(cdn)
+        async with main.app.router.lifespan_context(main.app):
+            api = InstagramBusinessAPI(http_client=GraphHTTPClient(transport=httpx.MockTransport(graph)))
+            main.app.state.business_api = api
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                body = {"insta_link": "sharedrun", "max_posts": 4}
+                executions = main.pipeline_flights.stats["executions"]
+                responses = await asyncio.gather(
+                    client.post("/vibecheck/stream", json=body),
+                    client.post("/vibecheck/stream", json=body),
+                    client.post("/vibecheck/", json=body),
+                )
+                assert main.pipeline_flights.stats["executions"] == executions + 1
+                # Images are fetched by the pipeline itself, so only once for all three requests
+                assert len(image_requests) == len(set(image_requests))
+            return responses
+
+    streamed, streamed_again, plain = asyncio.run(run())
+    for response in (streamed, streamed_again):
+        events = {event["event"]: event["data"] for event in map(json.loads, response.text.splitlines())}
+        assert set(events) == {*main.PIPELINE_STAGES, "done"}
+        assert events["vibe_profile"] == plain.json()["vibe_profile"]
+
+
+def test_demo_responses_are_cached_briefly(fixture_bytes):
+    from types import SimpleNamespace
+
+    photo = fixture_bytes("photo.jpg")
+
+    async def run():
+        main.image_fetcher.transport = httpx.MockTransport(lambda request: httpx.Response(200, content=photo))
+        # No Instagram credentials: the scrape serves demo data
+        main.app.state.business_api = SimpleNamespace(app_id=None, app_secret=None)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = {"insta_link": "demostream", "max_posts": 2}
+            executions = main.pipeline_flights.stats["executions"]
+            first = await client.post("/vibecheck/", json=body)
+            second = await client.post("/vibecheck/", json=body)
+            assert main.pipeline_flights.stats["executions"] == executions + 1
+        return first.json(), second.json()
+
+    first, second = asyncio.run(run())
+    assert first["scrape"]["source"] == "enhanced_demo"
+    assert second == first
+    key = main.vibe_cache_key("demostream", 2)
+    assert main.vibe_cache.get(key) is None
+    assert main.demo_cache.get(key) is not None
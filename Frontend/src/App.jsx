@@ -5,6 +5,7 @@ import Header from './components/Header';
 import LoadingSpinner from './components/LoadingSpinner';
 import VibeResults from './components/VibeResults';
 import Homepage from './components/Homepage';
+import { streamVibeCheck } from './api/vibeService';
 
 export default function App() {
     const [currentView, setCurrentView] = useState('homepage'); // 'homepage' or 'app'
@@ -70,25 +71,10 @@ export default function App() {
             
 
 
-            const response = await fetch('http://127.0.0.1:8000/vibecheck/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(requestBody),
+            // Stream stage results so the profile renders as soon as it is ready
+            const data = await streamVibeCheck(requestBody, (event, _data, partialResults) => {
+                setResults(partialResults);
             });
-
-            if (!response.ok) {
-                const errorData = await response.json().catch(() => ({}));
-                const errorMessage = errorData.detail || errorData.message || `HTTP error! status: ${response.status}`;
-                throw new Error(errorMessage);
-            }
-
-            const data = await response.json();
-            
-            if (!data.ok) {
-                throw new Error(data.message || 'Backend returned an error');
-            }
             
             setResults(data);
             
@@ -210,7 +196,7 @@ export default function App() {
                             <div className="relative z-10">
                                 {isLoading && <LoadingSpinner />}
                                 
-                                {results && !isLoading && (
+                                {results && (results.vibe_profile || !isLoading) && (
                                     <motion.div
                                         initial={{ opacity: 0, y: 20 }}
                                         animate={{ opacity: 1, y: 0 }}
@@ -0,0 +1,63 @@
+// src/api/vibeService.js
+const API_BASE_URL = 'http://127.0.0.1:8000';
+
+/**
+ * Run a streaming vibe check against /vibecheck/stream.
+ * The backend sends NDJSON lines of the form {"event": "...", "data": ...};
+ * onEvent is called for every stage (scrape, text_analysis, image_analysis,
+ * vibe_profile, memes) as soon as it arrives. Resolves with the merged results
+ * once the "done" event is received.
+ */
+export async function streamVibeCheck(requestBody, onEvent = () => {}) {
+    const response = await fetch(`${API_BASE_URL}/vibecheck/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(requestBody),
+    });
+
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        const errorMessage = errorData.detail || errorData.message || `HTTP error! status: ${response.status}`;
+        throw new Error(errorMessage);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const results = {};
+    let buffer = '';
+
+    const handleLine = (line) => {
+        if (!line.trim()) return;
+        const { event, data } = JSON.parse(line);
+
+        if (event === 'error') {
+            throw new Error(data.detail || 'Backend returned an error');
+        }
+
+        if (event === 'done') {
+            Object.assign(results, data);
+        } else {
+            results[event] = data;
+        }
+        onEvent(event, data, { ...results });
+    };
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+    }
+    handleLine(buffer + decoder.decode());
+
+    if (!results.ok) {
+        throw new Error(results.message || 'Vibe check stream ended unexpectedly');
+    }
+
+    return results;
+}